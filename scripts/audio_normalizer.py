@@ -1,72 +1,26 @@
 import os
+import sys
 import argparse
-import logging
-from moviepy.editor import VideoFileClip
 
-# Configure the logging settings
-logging.basicConfig(filename='../audio_normalizer.log', level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+# Make the video_editor package next to main.py importable when running a script from this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-
-def normalize_audio(input_path, output_path, volume_multiplier):
-    try:
-        clip = VideoFileClip(input_path)
-        normalized_clip = clip.volumex(volume_multiplier)  # Normalize the audio
-
-        # Save the video with normalized audio to the same folder as the original video
-        normalized_clip.write_videofile(output_path, codec="libx264", audio_codec="aac")
-
-        # Log success
-        logging.info(f"Audio normalized for {input_path} and saved as {output_path}")
-        print(f"Audio normalized for {input_path} and saved as {output_path}")
-
-        return output_path
-    except Exception as e:
-        # Log any errors that occur during processing
-        logging.error(f"Error processing {input_path}: {str(e)}")
-        print(f"Error processing {input_path}: {str(e)}")
-        return None
+from video_editor.cli import add_batch_arguments, run_from_args  # noqa: E402
 
 
 def main():
     parser = argparse.ArgumentParser(description="Normalize the audio of a video.")
-    parser.add_argument("-v", type=float, required=True,
-                        help="Volume multiplier for audio normalization (e.g., 1.0 for no change, Anything less than "
-                             "1.0 will equalize the audio.)")
-    parser.add_argument("-i", type=str, help="Input video file path")
-    parser.add_argument("-f", type=str, help="Input file containing a list of video file paths")
-    parser.add_argument("-o", type=str, help="Output location for the videos with normalized audio")
-
-    args = parser.parse_args()
-
-    if args.i and args.f:
-        logging.error("Error: Both input video and input file specified. Please choose one.")
-        print("Error: Both input video and input file specified. Please choose one.")
-        return
-
-    if not args.i and not args.f:
-        logging.error("Error: Either input video or input file must be specified.")
-        print("Error: Either input video or input file must be specified.")
-        return
-
-    if args.i:
-        input_paths = [args.i]
-    else:
-        with open(args.f, 'r') as file:
-            input_paths = [line.strip() for line in file]
-
-    for input_path in input_paths:
-        filename, extension = os.path.splitext(os.path.basename(input_path))
-        output_dir = os.path.dirname(input_path)
-        output_path = os.path.join(output_dir, f'{filename}_NORMALIZED{args.v}{extension}')
-
-        if args.o:
-            output_path = os.path.join(args.o, os.path.basename(output_path))
-
-        new_video_path = normalize_audio(input_path, output_path, args.v)
-
-        if new_video_path:
-            print(f"Audio normalized for {input_path} and saved as {new_video_path}")
+    normalization = parser.add_mutually_exclusive_group(required=True)
+    normalization.add_argument("-v", type=float, dest="volume_multiplier", metavar="V",
+                               help="Volume multiplier for audio normalization (e.g., 1.0 for no change, Anything "
+                                    "less than 1.0 will equalize the audio.)")
+    normalization.add_argument("--lufs", type=float, dest="target_lufs", metavar="LUFS",
+                               help="Normalize the audio to a target integrated loudness in LUFS (e.g., -16)")
+    parser.add_argument("--true-peak", type=float, default=-1.0,
+                        help="True-peak ceiling in dBTP when normalizing with --lufs (default: -1.0)")
+    add_batch_arguments(parser)
+
+    run_from_args(parser.parse_args())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import platform
+import resource
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+# Make the video_editor package next to main.py importable when running a script from this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from video_editor.stream_copy import run_ffmpeg  # noqa: E402
+from video_editor.pipeline import Pipeline  # noqa: E402
+
+# Configure the logging settings
+logging.basicConfig(filename='benchmark.log', level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+FRAME_RATE = 30
+
+# Pipeline settings for every operation of main.py that can be benchmarked, alone and combined
+OPERATIONS = {
+    "rotate_video": {"rotation": "left"},
+    "rotate_video_metadata": {"rotation": "left", "rotation_mode": "metadata"},
+    "increase_volume": {"increase_db": 6.0},
+    "normalize_audio": {"volume_multiplier": 0.8},
+    "loudness_normalize": {"target_lufs": -16.0},
+    "rotate_video+increase_volume": {"rotation": "left", "increase_db": 6.0},
+    "increase_volume+normalize_audio": {"increase_db": 6.0, "volume_multiplier": 0.8},
+}
+AUDIO_OPERATIONS = ["increase_volume", "normalize_audio", "loudness_normalize", "increase_volume+normalize_audio"]
+AUDIO_LAYOUTS = ["none", "mono", "stereo"]
+
+
+def generate_clip(work_dir, resolution, duration, audio):
+    # Synthetic test pattern with a sine tone, so benchmarks never depend on real footage
+    clip_path = os.path.join(work_dir, f"synthetic_{resolution}_{duration}s_{audio}.mp4")
+    if os.path.exists(clip_path):
+        return clip_path
+
+    arguments = ["-f", "lavfi", "-i", f"testsrc2=size={resolution}:rate={FRAME_RATE}:duration={duration}"]
+    if audio != "none":
+        arguments += ["-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+                      "-ac", "1" if audio == "mono" else "2", "-c:a", "aac"]
+    arguments += ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-g", str(FRAME_RATE * 2),
+                  clip_path]
+    run_ffmpeg(arguments)
+    return clip_path
+
+
+def run_case(input_path, output_path, operation, loudness_cache):
+    # Runs in a fresh worker process, so the peak RSS belongs to this case alone
+    settings = dict(OPERATIONS[operation], loudness_cache=loudness_cache)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        started = time.perf_counter()
+        saved_path = Pipeline(**settings).run(input_path, output_path)
+        wall_seconds = time.perf_counter() - started
+
+    # ru_maxrss is in kilobytes on Linux; the children are the ffmpeg processes of this case
+    peak_rss_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return saved_path is not None, wall_seconds, peak_rss_kb
+
+
+def compare_reports(previous_report, report):
+    previous_results = {result["case"]: result for result in previous_report["results"]}
+    print(f"{'case':<70} {'before':>9} {'after':>9} {'change':>8}")
+    for result in report["results"]:
+        previous = previous_results.get(result["case"])
+        if not previous or not previous["success"] or not result["success"]:
+            continue
+        change = (result["wall_seconds"] - previous["wall_seconds"]) / previous["wall_seconds"] * 100
+        print(f"{result['case']:<70} {previous['wall_seconds']:>8.2f}s {result['wall_seconds']:>8.2f}s "
+              f"{change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the video operations on synthetic test clips.")
+    parser.add_argument("--resolutions", type=str, default="640x360,1920x1080",
+                        help="Comma-separated clip resolutions (default: 640x360,1920x1080)")
+    parser.add_argument("--durations", type=str, default="5",
+                        help="Comma-separated clip durations in seconds (default: 5)")
+    parser.add_argument("--audio", type=str, default=",".join(AUDIO_LAYOUTS),
+                        help=f"Comma-separated audio layouts: {', '.join(AUDIO_LAYOUTS)} (default: all)")
+    parser.add_argument("--operations", type=str, default=",".join(OPERATIONS),
+                        help=f"Comma-separated operations: {', '.join(OPERATIONS)} (default: all)")
+    parser.add_argument("--work-dir", type=str,
+                        help="Folder for the synthetic clips and outputs, reused between runs (default: a temp dir)")
+    parser.add_argument("--report", type=str, default="benchmark_report.json",
+                        help="JSON report to write (default: benchmark_report.json)")
+    parser.add_argument("--compare", type=str, help="Previous JSON report to compare wall times against")
+
+    args = parser.parse_args()
+
+    operations = args.operations.split(",")
+    audio_layouts = args.audio.split(",")
+    unknown = [name for name in operations if name not in OPERATIONS] + \
+              [name for name in audio_layouts if name not in AUDIO_LAYOUTS]
+    if unknown:
+        logging.error(f"Error: Unknown operations or audio layouts: {', '.join(unknown)}")
+        print(f"Error: Unknown operations or audio layouts: {', '.join(unknown)}")
+        return
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="video_editor_benchmark_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    results = []
+    for resolution in args.resolutions.split(","):
+        for duration in [float(value) for value in args.durations.split(",")]:
+            for audio in audio_layouts:
+                input_path = generate_clip(work_dir, resolution, duration, audio)
+
+                for operation in operations:
+                    if audio == "none" and operation in AUDIO_OPERATIONS:
+                        continue
+
+                    case = f"{operation} {resolution} {duration:g}s {audio}"
+                    output_path = os.path.join(work_dir, f"output_{len(results)}.mp4")
+                    if os.path.exists(output_path):
+                        os.remove(output_path)
+
+                    # A fresh process per case keeps peak RSS and the loudness cache from leaking between cases
+                    loudness_cache = os.path.join(work_dir, f"loudness_cache_{len(results)}.jsonl")
+                    with ProcessPoolExecutor(max_workers=1) as executor:
+                        success, wall_seconds, peak_rss_kb = executor.submit(
+                            run_case, input_path, output_path, operation, loudness_cache).result()
+                    if os.path.exists(loudness_cache):
+                        os.remove(loudness_cache)
+
+                    frames = int(duration * FRAME_RATE)
+                    result = {
+                        "case": case,
+                        "operation": operation,
+                        "resolution": resolution,
+                        "duration": duration,
+                        "audio": audio,
+                        "success": success,
+                        "wall_seconds": round(wall_seconds, 4),
+                        "frames": frames,
+                        "fps": round(frames / wall_seconds, 2) if wall_seconds else None,
+                        "peak_rss_kb": peak_rss_kb,
+                        "input_bytes": os.path.getsize(input_path),
+                        "output_bytes": os.path.getsize(output_path) if success else None,
+                    }
+                    results.append(result)
+                    print(f"{case:<70} {wall_seconds:>8.2f}s {result['fps'] or 0:>9.1f} fps "
+                          f"{peak_rss_kb / 1024:>8.1f} MB{'' if success else '  FAILED'}")
+
+    report = {
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    with open(args.report, 'w') as file:
+        json.dump(report, file, indent=2)
+    logging.info(f"Benchmark report saved as {args.report}")
+    print(f"Benchmark report saved as {args.report}")
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            compare_reports(json.load(file), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Invocations that must return before any moviepy or numpy module is loaded
+CASES = {
+    "main --help": ["main.py", "--help"],
+    "main without an operation": ["main.py", "-i", "missing.mp4"],
+    "main with conflicting options": ["main.py", "--lufs", "-16", "-db", "3", "-i", "missing.mp4"],
+    "main with a missing input": ["main.py", "-db", "3", "-i", "missing.mp4", "--no-cache"],
+    "amplifier --help": [os.path.join("scripts", "amplifier.py"), "--help"],
+    "audio_normalizer --help": [os.path.join("scripts", "audio_normalizer.py"), "--help"],
+    "rotation --help": [os.path.join("scripts", "rotation.py"), "--help"],
+}
+HEAVY_MODULES = ("moviepy", "numpy", "imageio", "IPython")
+
+
+def time_case(arguments, runs, work_dir):
+    # Wall time of whole interpreter runs, the way cron or xargs pays for them
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + arguments, cwd=work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def heavy_imports(arguments, work_dir):
+    # -X importtime lists every module the run imported on stderr
+    result = subprocess.run([sys.executable, "-X", "importtime"] + arguments, cwd=work_dir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    modules = set()
+    for line in result.stderr.decode(errors='replace').splitlines():
+        if line.startswith("import time:") and "|" in line:
+            module = line.rsplit("|", 1)[1].strip()
+            if module.split(".")[0] in HEAVY_MODULES:
+                modules.add(module.split(".")[0])
+    return sorted(modules)
+
+
+def run_cases(args, work_dir):
+    baseline = statistics.median(time_case(["-c", "pass"], args.runs, work_dir))
+    print(f"{'case':<32} {'median':>9} {'min':>9}  heavy imports")
+    print(f"{'python -c pass':<32} {baseline:>7.1f}ms")
+
+    results = []
+    failed = False
+    for case, arguments in CASES.items():
+        arguments = [os.path.join(REPO_DIR, arguments[0])] + arguments[1:]
+        timings = time_case(arguments, args.runs, work_dir)
+        modules = heavy_imports(arguments, work_dir)
+        median = statistics.median(timings)
+        slow = args.max_ms is not None and median > args.max_ms
+        failed = failed or slow or bool(modules)
+        results.append({"case": case, "median_ms": round(median, 1), "min_ms": round(min(timings), 1),
+                        "heavy_imports": modules})
+        print(f"{case:<32} {median:>7.1f}ms {min(timings):>7.1f}ms  {', '.join(modules) or '-'}"
+              f"{'  TOO SLOW' if slow else ''}")
+    return results, baseline, failed
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how fast the command line tools start and fail.")
+    parser.add_argument("--runs", type=int, default=10, help="Runs per case (default: 10)")
+    parser.add_argument("--max-ms", type=float,
+                        help="Fail when the median of any case is slower than this many milliseconds")
+    parser.add_argument("--report", type=str, help="JSON report to write")
+
+    args = parser.parse_args()
+
+    # Run inside a scratch folder, so the log files and caches of the tools stay in it
+    with tempfile.TemporaryDirectory(prefix="video_editor_startup_") as scratch_dir:
+        work_dir = os.path.join(scratch_dir, "run")
+        os.makedirs(work_dir)
+        results, baseline, failed = run_cases(args, work_dir)
+
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump({"python_baseline_ms": round(baseline, 1), "results": results}, file, indent=2)
+        print(f"Startup report saved as {args.report}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
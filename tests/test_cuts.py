@@ -0,0 +1,72 @@
+import os
+import subprocess
+import numpy as np
+import pytest
+from video_editor.stream_copy import ffmpeg_binary, run_ffmpeg
+from video_editor.encoder import DEFAULT_ENCODER_SETTINGS
+from video_editor.cuts import clip_ranges, cut_video, encode_part, join_cut, plan_cut, snap_ranges
+
+FPS = 25
+DURATION = 14
+SIZE = 64
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    # 25 fps H.264 with a keyframe every 2 s; the brightness of every frame encodes its index, so decoded frames can
+    # be traced back to the source frame they came from
+    path = str(tmp_path_factory.mktemp("cuts") / "source.mp4")
+    run_ffmpeg(["-f", "lavfi", "-i", f"color=c=black:s={SIZE}x{SIZE}:r={FPS}:d={DURATION},"
+                                     f"geq=lum='mod(N\\,120)*2':cb=128:cr=128",
+                "-f", "lavfi", "-i", f"sine=frequency=440:duration={DURATION}",
+                "-c:v", "libx264", "-pix_fmt", "yuv420p", "-g", str(2 * FPS), "-keyint_min", str(2 * FPS),
+                "-sc_threshold", "0", "-crf", "10", "-c:a", "aac", path])
+    return path
+
+
+def frame_indices(path):
+    # Source frame index of every decoded frame, in order
+    result = subprocess.run([ffmpeg_binary(), "-loglevel", "error", "-i", path, "-map", "0:v:0", "-fps_mode",
+                             "passthrough", "-f", "rawvideo", "-pix_fmt", "yuv420p", "-"],
+                            check=True, stdout=subprocess.PIPE)
+    # Only the luma plane, as stored: converting to gray would rescale it
+    frames = np.frombuffer(result.stdout, dtype=np.uint8).reshape(-1, SIZE * SIZE * 3 // 2)[:, :SIZE * SIZE]
+    return [int(round(mean / 2)) for mean in frames.mean(axis=1)]
+
+
+def expected_indices(start_frame, end_frame):
+    return [index % 120 for index in range(start_frame, end_frame)]
+
+
+def test_snap_ranges_moves_cuts_to_the_next_frame():
+    assert snap_ranges([(3.3, 4.0), (10.0, 11.7)], FPS) == [(3.32, 4.0), (10.0, 11.72)]
+    assert snap_ranges([(1.001, 1.01)], FPS) == []
+
+
+def test_plan_cut_copies_whole_gops_only():
+    keyframes = [0.0, 2.0, 4.0, 6.0]
+    tolerance = 0.5 / FPS
+    assert plan_cut(3.32, 4.0, keyframes, 8.0, tolerance) == [("encode", 3.32, 4.0)]
+    assert plan_cut(1.12, 6.0, keyframes, 8.0, tolerance) == [("encode", 1.12, 2.0), ("copy", 2.0, 6.0)]
+    assert plan_cut(2.0, 5.2, keyframes, 8.0, tolerance) == [("copy", 2.0, 4.0), ("encode", 4.0, 5.2)]
+    assert plan_cut(3.0, 8.0, keyframes, 8.0, tolerance) == [("encode", 3.0, 4.0), ("copy", 4.0, None)]
+
+
+@pytest.mark.parametrize("start, end", [(3.3, 4.0), (10.0, 11.7), (4.0, 4.5)])
+def test_encode_part_keeps_exactly_the_frames_of_the_range(source, tmp_path, start, end):
+    (start, end), = snap_ranges([(start, end)], FPS)
+    part_path = str(tmp_path / "part.mp4")
+    encode_part(source, start, end, part_path, "libx264", "yuv420p", DEFAULT_ENCODER_SETTINGS, FPS)
+    assert frame_indices(part_path) == expected_indices(round(start * FPS), round(end * FPS))
+
+
+def test_cut_keeps_every_frame_of_every_range(source, tmp_path):
+    ranges = snap_ranges(clip_ranges([(1.1, 4.5), (6.3, 9.7), (12.0, None)], DURATION, 1.0 / FPS), FPS)
+    part_paths = cut_video(source, ranges, DURATION, FPS, ("h264", "yuv420p", f"{SIZE}x{SIZE}"), str(tmp_path),
+                           DEFAULT_ENCODER_SETTINGS)
+    output_path = join_cut(part_paths, source, ranges, str(tmp_path / "cut.mp4"), str(tmp_path))
+
+    expected = [index for start, end in ranges for index in expected_indices(round(start * FPS), round(end * FPS))]
+    assert len(expected) == 85 + 85 + 50
+    assert frame_indices(output_path) == expected
+    assert os.path.getsize(output_path) > 0
@@ -0,0 +1,67 @@
+import re
+import subprocess
+import numpy as np
+import pytest
+from video_editor.stream_copy import ffmpeg_binary, run_ffmpeg
+from video_editor.loudness import gated_loudness, measure_loudness
+
+DURATION = 10
+
+# Audio of the generated clips: mono and stereo, 48 and 44.1 kHz, a low tone that K-weighting attenuates, and a
+# quiet half that the relative gate leaves out
+SIGNALS = {
+    "sine": "sine=frequency=1000:sample_rate=48000",
+    "gated_stereo": "aevalsrc=0.5*sin(2*PI*997*t)*lt(t\\,5)+0.01*sin(2*PI*300*t)|0.3*sin(2*PI*60*t):s=48000",
+    "pink_noise": "anoisesrc=color=pink:sample_rate=44100:amplitude=0.3:seed=1",
+    "quiet": "aevalsrc=0.001*sin(2*PI*440*t):s=48000",
+}
+
+
+def make_clip(path, audio_source, audio_codec="aac"):
+    run_ffmpeg(["-f", "lavfi", "-i", f"color=c=black:s=64x64:r=25:d={DURATION}",
+                "-f", "lavfi", "-i", f"{audio_source}:d={DURATION}",
+                "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", audio_codec, "-shortest", path])
+
+
+def ebur128(path):
+    # Integrated loudness and true peak from the summary of ffmpeg's ebur128 filter, which prints one decimal
+    result = subprocess.run([ffmpeg_binary(), "-nostats", "-hide_banner", "-i", path, "-map", "0:a:0",
+                             "-af", "ebur128=peak=true", "-f", "null", "-"], check=True, stderr=subprocess.PIPE)
+    summary = result.stderr.decode(errors='replace').rsplit("Summary:", 1)[1]
+    integrated = float(re.search(r"I:\s+(\S+) LUFS", summary).group(1))
+    true_peak = float(re.search(r"True peak:\s+Peak:\s+(\S+) dBFS", summary).group(1))
+    return integrated, true_peak
+
+
+@pytest.mark.parametrize("name", SIGNALS)
+def test_measure_loudness_matches_ffmpeg_ebur128(tmp_path, name):
+    path = str(tmp_path / f"{name}.mp4")
+    make_clip(path, SIGNALS[name])
+    measured = measure_loudness(path)
+    integrated, true_peak = ebur128(path)
+    assert measured["integrated_lufs"] == pytest.approx(integrated, abs=0.1)
+    assert measured["true_peak_dbtp"] == pytest.approx(true_peak, abs=0.2)
+
+
+def test_true_peak_finds_the_peak_between_samples(tmp_path):
+    # A quarter of the sample rate, sampled 45 degrees off its peaks: every sample is at 0.707 of the true peak.
+    # ebur128 overshoots such a tone by about 0.6 dB, so the peak is checked against its known value instead.
+    path = str(tmp_path / "intersample.mkv")
+    make_clip(path, "aevalsrc=0.9*sin(2*PI*12000*t+PI/4):s=48000", "pcm_s16le")
+    measured = measure_loudness(path)
+    assert measured["true_peak_dbtp"] == pytest.approx(20 * np.log10(0.9), abs=0.1)
+    assert measured["integrated_lufs"] == pytest.approx(ebur128(path)[0], abs=0.1)
+
+
+def test_silence_has_no_loudness_or_peak(tmp_path):
+    path = str(tmp_path / "silence.mp4")
+    make_clip(path, "aevalsrc=0:s=48000")
+    assert measure_loudness(path) == {"integrated_lufs": None, "true_peak_dbtp": None}
+
+
+def test_gated_loudness_leaves_out_blocks_below_the_relative_gate():
+    # 2 s at 0 dB, then 2 s 40 dB quieter: only the loud blocks and the three that straddle the change count
+    powers = np.array([[1.0]] * 20 + [[1e-4]] * 20)
+    loud_blocks = [1.0] * 17 + [(3 + 1e-4) / 4, (2 + 2e-4) / 4, (1 + 3e-4) / 4]
+    assert gated_loudness(powers) == pytest.approx(-0.691 + 10 * np.log10(np.mean(loud_blocks)))
+    assert gated_loudness(powers[:3]) is None
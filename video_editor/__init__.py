@@ -0,0 +1,6 @@
+# Batch video editing: rotation, volume changes and loudness normalization over files, folders and globs.
+# moviepy and numpy are only imported once a video is processed, so importing the package stays cheap.
+from video_editor.pipeline import Pipeline
+from video_editor.batch import DEFAULT_OPTIONS, OPERATIONS, process_batch
+
+__all__ = ["DEFAULT_OPTIONS", "OPERATIONS", "Pipeline", "process_batch"]
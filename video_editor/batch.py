@@ -0,0 +1,658 @@
+import os
+import time
+import uuid
+import shutil
+import signal
+import logging
+import multiprocessing
+import tempfile
+import subprocess
+from argparse import Namespace
+from collections import deque
+from itertools import chain, islice
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from video_editor.stream_copy import DEFAULT_AUDIO_CHUNK_SECONDS
+from video_editor.loudness import DEFAULT_CACHE_PATH
+from video_editor.pipeline import Pipeline
+from video_editor.encoder import apply_container, resolve_encoder_settings
+from video_editor.journal import DONE, FAILED, PENDING, RUNNING, Journal, file_signature
+from video_editor.metrics import Metrics, MetricsWriter
+from video_editor.output_cache import DEFAULT_OUTPUT_CACHE_DIR, DEFAULT_OUTPUT_CACHE_GB, OutputCache
+from video_editor.cuts import cut_ranges, join_videos
+from video_editor.previews import (DEFAULT_PROXY_BITRATE, DEFAULT_PROXY_HEIGHT, DEFAULT_SHEET_TILES, PREVIEW_SUFFIXES,
+                                   preview_cache_settings, preview_extension, preview_paths)
+from video_editor.discovery import TEMP_PREFIX, discover_videos
+from video_editor.watch import DEFAULT_POLL_SECONDS, DEFAULT_SETTLE_SECONDS, FolderWatcher
+from video_editor.probe import DEFAULT_PROBE_CACHE_PATH, DEFAULT_PROBE_THREADS, probe_videos, rejection_reason
+
+# Longest file name most file systems allow, in bytes
+MAX_FILENAME_LENGTH = 255
+
+# Videos probed before each round of processing, so a huge folder does not have to be probed before the first encode
+DEFAULT_PREFLIGHT_BATCH = 100
+
+VALID_EXTENSIONS = ['.mp4', '.mkv', '.flv', '.avi', '.mov', '.wmv', '.mpeg', '.mpg', '.m4v']
+
+# Operations accepted by process_batch, with their defaults. Each one is also a command line option.
+OPERATIONS = {
+    "rotation": None,  # "left" or "right"
+    "rotation_mode": "pixels",  # or "metadata"
+    "increase_db": None,
+    "volume_multiplier": None,
+    "target_lufs": None,
+    "true_peak": -1.0,
+    "trim_start": None,  # seconds or [hours:]minutes:seconds
+    "trim_end": None,
+    "keep_ranges": None,  # "0:05-1:20,2:00-" or [(5, 80), (120, None)]
+    "concat": None,  # path the outputs are joined into, in input order
+}
+
+# Options accepted by process_batch, with their defaults. They are named like the command line options.
+DEFAULT_OPTIONS = {
+    "output_dir": None,
+    "mirror": False,
+    "jobs": 1,
+    "segments": 1,
+    "journal": None,
+    "metrics": None,
+    "metrics_format": "jsonl",
+    "quarantine": None,
+    "probe_threads": DEFAULT_PROBE_THREADS,
+    "probe_cache": DEFAULT_PROBE_CACHE_PATH,
+    "preflight_batch": DEFAULT_PREFLIGHT_BATCH,
+    "output_cache": DEFAULT_OUTPUT_CACHE_DIR,
+    "output_cache_size": DEFAULT_OUTPUT_CACHE_GB,
+    "no_cache": False,
+    "loudness_cache": DEFAULT_CACHE_PATH,
+    "audio_chunk": DEFAULT_AUDIO_CHUNK_SECONDS,
+    "settle": DEFAULT_SETTLE_SECONDS,
+    "poll": DEFAULT_POLL_SECONDS,
+    "queue_size": None,  # 2 x jobs
+    # Previews written next to each output, see previews.py
+    "contact_sheet": False,
+    "proxy": False,
+    "waveform": False,
+    "sheet_tiles": DEFAULT_SHEET_TILES,
+    "proxy_height": DEFAULT_PROXY_HEIGHT,
+    "proxy_bitrate": DEFAULT_PROXY_BITRATE,
+    # Encoder settings, see encoder.py
+    "profile": None,
+    "encoder_config": None,
+    **{name: None for name in ["preset", "crf", "bitrate", "audio_bitrate", "threads", "container"]},
+}
+
+
+def batch_settings(operations, options=None):
+    # One namespace with every operation and option, as read by Pipeline.from_args and the functions below. Raises
+    # ValueError for unknown names and invalid combinations.
+    options = options or {}
+    unknown = sorted(set(operations) - set(OPERATIONS)) + sorted(set(options) - set(DEFAULT_OPTIONS))
+    if unknown:
+        raise ValueError(f"Unknown operations or options: {', '.join(unknown)}")
+
+    settings = Namespace(**dict(OPERATIONS, **DEFAULT_OPTIONS))
+    for name, value in chain(operations.items(), options.items()):
+        if value is not None:
+            setattr(settings, name, value)
+    if settings.queue_size is None:
+        settings.queue_size = 2 * settings.jobs
+
+    if settings.increase_db is None and settings.rotation is None and settings.volume_multiplier is None and \
+            settings.target_lufs is None and settings.trim_start is None and settings.trim_end is None and \
+            settings.keep_ranges is None and settings.concat is None:
+        raise ValueError("You need to specify an operation (audio increase, video rotation, audio normalization, "
+                         "cuts or concatenation, or a combination of them with -db, -r, -v, --lufs, --start/--end, "
+                         "--keep and --concat")
+    if settings.target_lufs is not None and (settings.increase_db is not None or
+                                             settings.volume_multiplier is not None):
+        raise ValueError("--lufs sets the final loudness and cannot be combined with -db or -v.")
+    cut_ranges(settings.trim_start, settings.trim_end, settings.keep_ranges)
+    try:
+        resolve_encoder_settings(settings)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Invalid encoder settings: {str(e)}")
+    if settings.audio_chunk <= 0:
+        raise ValueError("--audio-chunk must be greater than 0.")
+    if min(settings.jobs, settings.segments, settings.probe_threads, settings.preflight_batch) < 1:
+        raise ValueError("--jobs, --segments, --probe-threads and --preflight-batch must be at least 1.")
+    if settings.mirror and not settings.output_dir:
+        raise ValueError("--mirror needs an output location (-o).")
+    if settings.queue_size < 1 or settings.settle < 0 or settings.poll <= 0:
+        raise ValueError("--queue-size must be at least 1, --settle at least 0 and --poll greater than 0.")
+    if settings.sheet_tiles < 1 or settings.proxy_height < 2:
+        raise ValueError("--sheet-tiles must be at least 1 and --proxy-height at least 2.")
+    return settings
+
+
+class Batch:
+    # Where the outcome of every video goes: the journal, the metrics file, the progress callback and the list of
+    # results returned by process_batch. The parent process alone records results, never the workers. With
+    # keep_outputs, the outputs are also kept in input order to be joined by --concat. Without keep_failed, failed
+    # videos are only counted, e.g. in a watched folder that runs for days.
+
+    def __init__(self, journal=None, metrics_writer=None, progress=None, keep_results=True, keep_outputs=False,
+                 keep_failed=True):
+        self.journal = journal
+        self.metrics_writer = metrics_writer
+        self.progress = progress
+        self.keep_results = keep_results
+        self.keep_outputs = keep_outputs
+        self.keep_failed = keep_failed
+        self.results = []
+        self.discovered = 0
+        self.completed = 0
+        self.failed = 0
+        self.failed_paths = []
+        # What every pre-flight round so far found: videos ready and rejected, and the seconds, frames and bytes of
+        # the ready ones
+        self.preflight = {"ready": 0, "rejected": 0, "seconds": 0.0, "frames": 0, "bytes": 0}
+        self.input_order = []
+        self.outputs = {}
+
+    def record(self, input_path, output=None, started=None, metrics_record=None, sync=True, **details):
+        result = {"input": input_path, "output": output, "status": DONE if output else FAILED}
+        if started is not None:
+            result["seconds"] = round(time.time() - started, 3)
+        result.update(details)
+
+        if not output:
+            self.failed += 1
+            if self.keep_failed:
+                self.failed_paths.append(input_path)
+        elif self.keep_outputs:
+            self.outputs[input_path] = output
+        if self.journal:
+            self.journal.record(input_path, result["status"], sync=sync,
+                                **{name: value for name, value in result.items()
+                                   if name not in ("input", "status") and value is not None})
+        if self.metrics_writer and metrics_record:
+            self.metrics_writer.write(metrics_record)
+            result["metrics"] = metrics_record
+
+        self.completed += 1
+        if self.keep_results:
+            self.results.append(result)
+        if self.progress:
+            self.progress(result, self.completed, self.discovered)
+
+    def record_preflight(self, totals):
+        for name, value in totals.items():
+            self.preflight[name] += value
+        if self.metrics_writer:
+            self.metrics_writer.write_preflight(self.preflight)
+
+    def record_join(self, output, started, input_paths):
+        # The video joined by --concat is not one of the inputs, so it goes to the results and progress only
+        result = {"input": None, "inputs": input_paths, "output": output, "status": DONE if output else FAILED,
+                  "seconds": round(time.time() - started, 3)}
+        if self.keep_results:
+            self.results.append(result)
+        if self.progress:
+            self.progress(result, self.completed, self.discovered)
+
+
+def get_non_conflicting_filename(path):
+    base, ext = os.path.splitext(path)
+    counter = 1
+    new_path = path
+
+    while os.path.exists(new_path):
+        new_path = f"{base}_{counter}{ext}"
+        counter += 1
+
+    return new_path
+
+
+def reserve_filename(path):
+    # Like get_non_conflicting_filename, but the free name is created (empty) in the same step, so workers writing
+    # into one folder in parallel never pick the same name. The encode then overwrites the empty file.
+    base, ext = os.path.splitext(path)
+    counter = 1
+    new_path = path
+
+    while True:
+        try:
+            os.close(os.open(new_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+            return new_path
+        except FileExistsError:
+            new_path = f"{base}_{counter}{ext}"
+            counter += 1
+
+
+def collect_results(running, batch, timeout=None):
+    # Wait for the first of the running videos to finish (or for the timeout) and record every finished one
+    finished, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+    for future in finished:
+        input_path, started = running.pop(future)
+        try:
+            saved_path, metrics_record = future.result()
+        except Exception as e:
+            logging.error(f"Worker failed for {input_path}: {str(e)}")
+            print(f"Worker failed for {input_path}: {str(e)}")
+            saved_path, metrics_record = None, None
+        batch.record(input_path, saved_path, started, metrics_record)
+
+
+def name_length(name):
+    # File systems limit names in bytes, not characters
+    return len(os.fsencode(name))
+
+
+def shorten_name(name, max_length):
+    # Cut whole characters off the end until the name fits in max_length bytes
+    while name_length(name) > max_length:
+        name = name[:-1]
+    return name
+
+
+def create_short_link(input_path, link_dir):
+    # Give a video with an over-long name a short, unique alias in link_dir (the output folder, which has to be
+    # writable anyway, unlike the input's) instead of copying it. A symlink keeps os.path.realpath pointing at the
+    # original (so caches keyed by path still hit); a hardlink is the fallback where symlinks are not allowed.
+    extension = os.path.splitext(input_path)[1]
+    link_path = os.path.join(link_dir, f"{TEMP_PREFIX}{os.getpid()}_{uuid.uuid4().hex}{extension}")
+    try:
+        os.symlink(os.path.abspath(input_path), link_path)
+    except OSError:
+        os.link(input_path, link_path)
+    return link_path
+
+
+def quarantine_video(input_path, quarantine_dir):
+    # Move a video that cannot be processed out of the way, so the next batch does not pick it up again
+    os.makedirs(quarantine_dir, exist_ok=True)
+    quarantine_path = get_non_conflicting_filename(os.path.join(quarantine_dir, os.path.basename(input_path)))
+    shutil.move(input_path, quarantine_path)
+    return quarantine_path
+
+
+def preflight(input_paths, settings, batch):
+    # Probe every video's container before anything is decoded, drop (or quarantine) the ones that cannot be
+    # processed and report what the batch adds up to. Returns the videos to process, their probe results and the
+    # totals of this round, which are also added to the batch's and written to --metrics.
+    pipeline = Pipeline.from_args(settings)
+    entries = probe_videos(input_paths, settings.probe_cache, settings.probe_threads)
+
+    ready_paths = []
+    probes = {}
+    for input_path, entry in zip(input_paths, entries):
+        reason = rejection_reason(entry, pipeline)
+        if reason is None:
+            ready_paths.append(input_path)
+            probes[input_path] = entry
+            continue
+
+        details = {"reason": reason}
+        if settings.quarantine and os.path.exists(input_path):
+            try:
+                details["quarantined"] = quarantine_video(input_path, settings.quarantine)
+            except OSError as e:
+                logging.error(f"Error quarantining {input_path}: {str(e)}")
+                print(f"Error quarantining {input_path}: {str(e)}")
+        logging.error(f"Error: Skipping {input_path}: {reason}")
+        print(f"Error: Skipping {input_path}: {reason}")
+        batch.record(input_path, sync=False, **details)
+
+    totals = {"ready": len(ready_paths), "rejected": len(input_paths) - len(ready_paths),
+              "seconds": sum(entry["duration"] for entry in probes.values()),
+              "frames": sum(entry["frames"] or 0 for entry in probes.values()),
+              "bytes": sum(entry["size"] for entry in probes.values())}
+    hours, remainder = divmod(int(totals["seconds"]), 3600)
+    summary = (f"Pre-flight: {totals['ready']} videos ready ({hours}:{remainder // 60:02d}:{remainder % 60:02d}, "
+               f"{totals['frames']} frames, {totals['bytes'] / 1024 ** 2:.1f} MB), {totals['rejected']} rejected")
+    logging.info(summary)
+    print(summary)
+    batch.record_preflight(totals)
+    return ready_paths, probes, totals
+
+
+def prepare_videos(discovered, settings, batch):
+    # Pre-flight the discovered videos a few at a time and yield (video, probe result, output folder) for each one
+    # that is ready, so processing starts while a large tree is still being discovered
+    journal = batch.journal
+    while True:
+        input_paths = []
+        roots = {}
+        for input_path, root in islice(discovered, settings.preflight_batch):
+            input_paths.append(input_path)
+            roots[input_path] = root
+        if not input_paths:
+            return
+        batch.discovered += len(input_paths)
+        if batch.keep_outputs:
+            batch.input_order += input_paths
+
+        if journal:
+            # Resume from the journal: videos already done are skipped, interrupted and failed ones run again
+            done_paths = [input_path for input_path in input_paths if journal.state(input_path) == DONE]
+            if batch.keep_outputs:
+                batch.outputs.update((input_path, journal.entries[input_path].get("output"))
+                                     for input_path in done_paths)
+            done_count = len(done_paths)
+            input_paths = [input_path for input_path in input_paths if journal.state(input_path) != DONE]
+            if done_count:
+                logging.info(f"Skipping {done_count} videos already done according to {journal.path}")
+                print(f"Skipping {done_count} videos already done according to {journal.path}")
+
+        input_paths, probes, _ = preflight(input_paths, settings, batch)
+
+        if journal:
+            for input_path in input_paths:
+                if journal.state(input_path) is None:
+                    journal.record(input_path, PENDING, sync=False)
+
+        if settings.jobs > 1:
+            # Start the longest videos first, so a long one does not keep a single worker busy after the rest are done
+            input_paths.sort(key=lambda input_path: probes[input_path]["duration"], reverse=True)
+
+        for input_path in input_paths:
+            yield input_path, probes[input_path], mirrored_output_dir(settings, input_path, roots[input_path])
+
+
+def mirrored_output_dir(settings, input_path, root):
+    # With --mirror, the video's folder relative to the input folder, recreated under the output location
+    if not settings.mirror or root is None:
+        return None
+    return os.path.normpath(os.path.join(settings.output_dir, os.path.relpath(os.path.dirname(input_path), root)))
+
+
+def run_batch(discovered, settings, batch):
+    # Process (video, root folder) pairs as they are discovered, one at a time or on --jobs worker processes
+    videos = prepare_videos(discovered, settings, batch)
+
+    if settings.jobs == 1:
+        for input_path, probe, output_dir in videos:
+            started = time.time()
+            if batch.journal:
+                batch.journal.record(input_path, RUNNING)
+            saved_path, metrics_record = process_video(input_path, settings, probe, output_dir)
+            batch.record(input_path, saved_path, started, metrics_record)
+    else:
+        # Workers only process videos and report back; the parent alone writes the journal
+        with ProcessPoolExecutor(max_workers=settings.jobs) as executor:
+            running = {}
+            while True:
+                # Only hand out one video per free worker, so a video is marked running when it actually starts
+                while len(running) < settings.jobs:
+                    video = next(videos, None)
+                    if video is None:
+                        break
+                    input_path, probe, output_dir = video
+                    if batch.journal:
+                        batch.journal.record(input_path, RUNNING)
+                    future = executor.submit(process_video, input_path, settings, probe, output_dir)
+                    running[future] = (input_path, time.time())
+
+                if not running:
+                    break
+
+                collect_results(running, batch)
+
+    if batch.failed_paths:
+        logging.error(f"{len(batch.failed_paths)} of {batch.discovered} videos failed: "
+                      f"{', '.join(batch.failed_paths)}")
+        print(f"{len(batch.failed_paths)} of {batch.discovered} videos failed: {', '.join(batch.failed_paths)}")
+
+    if settings.concat:
+        join_outputs(settings, batch)
+
+
+def join_outputs(settings, batch):
+    # Join the outputs of the batch into one video, in the order the videos were listed or found, without
+    # re-encoding them. A batch with failed videos is not joined, so no clip goes missing from the result unnoticed.
+    started = time.time()
+    output_paths = [batch.outputs[input_path] for input_path in batch.input_order if batch.outputs.get(input_path)]
+    if batch.failed or not output_paths:
+        reason = f"{batch.failed} of {batch.discovered} videos failed" if batch.failed else "no videos"
+        logging.error(f"Error: Not joining the videos into {settings.concat}: {reason}")
+        print(f"Error: Not joining the videos into {settings.concat}: {reason}")
+        batch.record_join(None, started, output_paths)
+        return
+
+    joined_path = None
+    output_path = reserve_filename(settings.concat)
+    work_dir = tempfile.mkdtemp(prefix=TEMP_PREFIX, dir=os.path.dirname(output_path) or ".")
+    try:
+        joined_path = join_videos(output_paths, output_path, work_dir)
+        logging.info(f"{len(output_paths)} videos joined into {joined_path}")
+        print(f"{len(output_paths)} videos joined into {joined_path}")
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Error joining the videos into {output_path}: {e.stderr.decode(errors='replace').strip()}")
+        print(f"Error joining the videos into {output_path}: {e.stderr.decode(errors='replace').strip()}")
+    except (OSError, ValueError) as e:
+        logging.error(f"Error joining the videos into {output_path}: {str(e)}")
+        print(f"Error joining the videos into {output_path}: {str(e)}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if not joined_path and os.path.exists(output_path):
+            os.remove(output_path)
+    batch.record_join(joined_path, started, output_paths)
+
+
+def ignore_interrupts():
+    # Ctrl+C reaches every process of the terminal's process group. Workers leave it to the parent, which decides
+    # what happens to the videos they are processing.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def watch_folder(watch_dir, settings, batch):
+    # Process videos dropped into the watched folder until interrupted. The worker processes stay up with moviepy
+    # loaded, and at most --queue-size settled videos wait for a worker. While the queue is full the folder is not
+    # read at all, so new files simply wait on disk until there is room.
+    # Outputs, and rejected videos moved to --quarantine, are never picked up again when inside the watched folder
+    watcher = FolderWatcher(watch_dir, VALID_EXTENSIONS, settings.settle,
+                            [folder for folder in (settings.output_dir, settings.quarantine) if folder])
+    queue = deque()
+    logging.info(f"Watching {watch_dir} for new videos")
+    print(f"Watching {watch_dir} for new videos. Press Ctrl+C to stop.")
+
+    with ProcessPoolExecutor(max_workers=settings.jobs, initializer=ignore_interrupts) as executor:
+        running = {}
+        try:
+            while True:
+                if len(queue) < settings.queue_size:
+                    # A video already done is skipped only while it is unchanged, so one overwritten under the same
+                    # name is processed again
+                    signatures = {input_path: file_signature(input_path)
+                                  for input_path in watcher.poll(settings.queue_size - len(queue))}
+                    input_paths = [input_path for input_path, signature in signatures.items()
+                                   if signature and not batch.journal.is_done(input_path, signature)]
+                    if input_paths:
+                        batch.discovered += len(input_paths)
+                        input_paths, probes, _ = preflight(input_paths, settings, batch)
+                        for input_path in input_paths:
+                            batch.journal.record(input_path, PENDING, sync=False, **signatures[input_path])
+                            queue.append((input_path, probes[input_path],
+                                          mirrored_output_dir(settings, input_path, watch_dir)))
+
+                while queue and len(running) < settings.jobs:
+                    input_path, probe, output_dir = queue.popleft()
+                    batch.journal.record(input_path, RUNNING)
+                    future = executor.submit(process_video, input_path, settings, probe, output_dir)
+                    running[future] = (input_path, time.time())
+
+                if running:
+                    collect_results(running, batch, timeout=settings.poll)
+                else:
+                    time.sleep(settings.poll)
+        except KeyboardInterrupt:
+            # Queued videos are still pending in the journal and are picked up again on the next start. Videos being
+            # processed are finished and recorded, unless Ctrl+C is pressed again: then they stay running in the
+            # journal and are processed again on the next start too.
+            if running:
+                logging.info(f"Finishing {len(running)} videos being processed")
+                print(f"Finishing {len(running)} videos being processed. Press Ctrl+C again to stop right away.")
+                try:
+                    while running:
+                        collect_results(running, batch)
+                except KeyboardInterrupt:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    for process in multiprocessing.active_children():
+                        process.terminate()
+            logging.info(f"Stopped watching {watch_dir}")
+            print(f"Stopped watching {watch_dir}")
+
+
+# Run operations on every video of inputs and return one result per video. inputs is a path or a list of paths:
+# video files, folders (searched recursively) and glob patterns. operations and options are dicts named like
+# OPERATIONS and DEFAULT_OPTIONS, e.g.
+#     process_batch(["/videos"], {"target_lufs": -16}, {"output_dir": "/normalized", "jobs": 4})
+# Every result is a dict with "input", "output" (None on failure), "status" ("done" or "failed") and, depending on how
+# the video went, "seconds", "reason", "quarantined" and "metrics". progress, if given, is called as
+# progress(result, completed, discovered) after every video; discovered grows while the inputs are searched. With
+# the concat operation, the last result is the joined video, with "input" None and "inputs" the outputs it joins.
+# Raises ValueError for unknown or invalid operations and options.
+def process_batch(inputs, operations, options=None, progress=None):
+    settings = batch_settings(operations, options)
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    # Outputs written into the output folder are never picked up as inputs, even when it is inside an input folder
+    skip_dirs = [settings.output_dir] if settings.output_dir else []
+    discovered = chain.from_iterable(discover_videos(input_pattern, VALID_EXTENSIONS, skip_dirs)
+                                     for input_pattern in inputs)
+
+    journal = Journal(settings.journal) if settings.journal else None
+    metrics_writer = MetricsWriter(settings.metrics, settings.metrics_format) if settings.metrics else None
+    batch = Batch(journal, metrics_writer, progress, keep_outputs=bool(settings.concat))
+    try:
+        run_batch(discovered, settings, batch)
+    finally:
+        if journal:
+            journal.close()
+    return batch.results
+
+
+# Run the requested operations on a single video. Returns the saved path (None if the video failed) and, with
+# --metrics, the video's metrics record. This is also the unit of work sent to worker processes when --jobs is
+# greater than 1, so the records are written by the parent.
+def process_video(input_path, settings, probe=None, output_dir=None):
+    started = time.perf_counter()
+    metrics = Metrics(input_path) if settings.metrics else None
+    saved_path = process_single_video(input_path, settings, metrics, probe, output_dir)
+
+    if not metrics:
+        return saved_path, None
+
+    metrics.set("output", saved_path)
+    metrics.set("status", DONE if saved_path else FAILED)
+    metrics.set("total_seconds", round(time.perf_counter() - started, 4))
+    metrics.set("bytes_in", os.path.getsize(input_path) if os.path.exists(input_path) else None)
+    metrics.set("bytes_out", os.path.getsize(saved_path) if saved_path else None)
+    return saved_path, metrics.as_dict()
+
+
+def process_single_video(input_path, settings, metrics=None, probe=None, output_dir=None):
+    pipeline = Pipeline.from_args(settings)
+    if metrics and probe and not pipeline.changes_pixels and not pipeline.keep_ranges:
+        # The stream is copied, so the frame count comes from the pre-flight probe instead of being counted
+        metrics.set("frames", probe["frames"])
+
+    # Join the operation tags with underscores to create a filename suffix
+    operation_suffix = "_".join(pipeline.operation_tags())
+    if not operation_suffix:
+        # Only --concat was asked for, so the videos are joined as they are
+        return input_path
+
+    saved_path = None
+    link_path = None
+    try:
+        source_path = input_path
+
+        filename, extension = os.path.splitext(os.path.basename(input_path))
+        extension = apply_container(extension, pipeline.encoder_settings)
+
+        # Create the output path with the operation suffix, shortening the name so that it stays within the file
+        # name limit even after reserve_filename adds a counter. Previews replace the extension with
+        # their own, longer suffix, so room is left for the longest of them.
+        preview_kinds = pipeline.preview_settings["kinds"] if pipeline.preview_settings else []
+        name_end_length = max([name_length(extension)] + [len(PREVIEW_SUFFIXES[kind]) for kind in preview_kinds])
+        filename = shorten_name(filename, MAX_FILENAME_LENGTH - len(f'_{operation_suffix}') - name_end_length - 8)
+        output_path = os.path.join(os.path.dirname(input_path), f'{filename}_{operation_suffix}{extension}')
+
+        output_dir = output_dir or settings.output_dir
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            output_path = os.path.join(output_dir, os.path.basename(output_path))
+
+        # Check if the file name length exceeds 255 bytes
+        if name_length(os.path.basename(input_path)) > 254:
+            logging.warning(f"File over 255 warning!!! Fix: {input_path}")
+            link_path = create_short_link(input_path, os.path.dirname(output_path) or ".")
+            source_path = link_path
+
+        output_cache = None
+        if not settings.no_cache:
+            output_cache = OutputCache(settings.output_cache, settings.output_cache_size * 1024 ** 3)
+            if not output_cache.links_to(os.path.dirname(os.path.abspath(output_path))):
+                output_cache = None
+        if output_cache:
+            with metrics.stage("hash") if metrics else nullcontext():
+                cache_key = output_cache.key(source_path, pipeline.cache_settings(), extension)
+            # Previews are cached next to the output they were made from and only count as a hit together with it
+            preview_keys = {}
+            for kind in preview_kinds:
+                preview_keys[kind] = output_cache.derived_key(cache_key,
+                                                              preview_cache_settings(pipeline.preview_settings, kind))
+            cached_path = output_cache.lookup(cache_key, extension)
+            cached_previews = {kind: output_cache.lookup(key, preview_extension(kind))
+                               for kind, key in preview_keys.items()}
+            if cached_path and all(cached_previews.values()):
+                if metrics:
+                    metrics.set("cache", "hit")
+                # A re-run finds its earlier output already in place instead of adding a numbered copy
+                if not (os.path.exists(output_path) and os.path.samefile(output_path, cached_path)):
+                    output_path = reserve_filename(output_path)
+                    temp_path = os.path.join(os.path.dirname(output_path), f"{TEMP_PREFIX}{uuid.uuid4().hex}.tmp")
+                    try:
+                        os.link(cached_path, temp_path)
+                        os.replace(temp_path, output_path)
+                    except OSError:
+                        os.remove(output_path)
+                        raise
+                for kind, path in preview_paths(output_path, preview_kinds).items():
+                    if not (os.path.exists(path) and os.path.samefile(path, cached_previews[kind])):
+                        if os.path.exists(path):
+                            os.remove(path)
+                        os.link(cached_previews[kind], path)
+                logging.info(f"Video {operation_suffix.lower()} found in the cache, saved as {output_path}")
+                print(f"Video {operation_suffix.lower()} found in the cache, saved as {output_path}")
+                return output_path
+            if metrics:
+                metrics.set("cache", "miss")
+
+        # Check if the output path already exists and claim a non-conflicting name
+        output_path = reserve_filename(output_path)
+
+        # Run all operations in a single pass and only keep the output if every one of them succeeded
+        if pipeline.run(source_path, output_path, metrics):
+            logging.info(f"Video {operation_suffix.lower()} saved as {output_path}")
+            print(f"Video {operation_suffix.lower()} saved as {output_path}")
+            saved_path = output_path
+            if output_cache:
+                try:
+                    output_cache.store(cache_key, extension, output_path)
+                    for kind, path in preview_paths(output_path, preview_kinds).items():
+                        if os.path.exists(path):
+                            output_cache.store(preview_keys[kind], preview_extension(kind), path)
+                except OSError as e:
+                    logging.warning(f"Could not add {output_path} to the output cache: {str(e)}")
+        else:
+            logging.error(f"Error: Operations failed for video {input_path}")
+            print(f"Error: Operations failed for video {input_path}")
+            # The name was claimed for this video, so whatever the failed run left there is removed
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+        return saved_path
+
+    except OSError as e:
+        logging.error(f"OSError: {str(e)} Skipping this file and moving to the next one.")
+        print(f"OSError: {str(e)} Skipping this file and moving to the next one.")
+        return None
+
+    finally:
+        # Only the alias is removed, never the video it points to
+        if link_path:
+            os.remove(link_path)
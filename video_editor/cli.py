@@ -0,0 +1,182 @@
+import os
+import sys
+import argparse
+import logging
+from video_editor.stream_copy import DEFAULT_AUDIO_CHUNK_SECONDS
+from video_editor.loudness import DEFAULT_CACHE_PATH
+from video_editor.encoder import add_encoder_arguments
+from video_editor.journal import Journal
+from video_editor.metrics import METRICS_FORMATS, MetricsWriter
+from video_editor.output_cache import DEFAULT_OUTPUT_CACHE_DIR, DEFAULT_OUTPUT_CACHE_GB
+from video_editor.segments import MIN_SEGMENT_SECONDS
+from video_editor.previews import DEFAULT_PROXY_BITRATE, DEFAULT_PROXY_HEIGHT, DEFAULT_SHEET_TILES
+from video_editor.discovery import TEMP_PREFIX, discover_videos, read_video_list
+from video_editor.watch import DEFAULT_POLL_SECONDS, DEFAULT_SETTLE_SECONDS
+from video_editor.probe import DEFAULT_PROBE_CACHE_PATH, DEFAULT_PROBE_THREADS
+from video_editor.batch import (DEFAULT_OPTIONS, DEFAULT_PREFLIGHT_BATCH, OPERATIONS, VALID_EXTENSIONS, Batch,
+                                batch_settings, run_batch, watch_folder)
+
+DEFAULT_LOG_FILE = 'video_editor.log'
+
+
+def add_batch_arguments(parser):
+    # Input, output and batch options shared by main.py and the scripts. The operations are added by each tool.
+    parser.add_argument("--loudness-cache", type=str, default=DEFAULT_CACHE_PATH,
+                        help=f"File caching loudness measurements between runs (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--audio-chunk", type=float, default=DEFAULT_AUDIO_CHUNK_SECONDS,
+                        help=f"Seconds of audio processed at a time, which bounds memory use on long recordings "
+                             f"(default: {DEFAULT_AUDIO_CHUNK_SECONDS})")
+    parser.add_argument("-i", type=str, help="Input video file path, a folder that is searched recursively, or a glob "
+                                             "pattern such as \"/videos/2024-*/**/*.mp4\" (quote it)")
+    parser.add_argument("-f", type=str, help="Input file containing a list of video file paths")
+    parser.add_argument("-o", type=str, dest="output_dir", metavar="O", help="Output location for the modified videos")
+    parser.add_argument("--mirror", action="store_true",
+                        help="Recreate the folder layout of a -i folder or glob under -o instead of writing every "
+                             "output into -o itself")
+    parser.add_argument("--watch", type=str,
+                        help="Keep running and process every video dropped into this folder (or a folder below it) "
+                             "once it has been fully copied. Needs -o.")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help=f"Seconds a watched video's size must stay the same before it is processed "
+                             f"(default: {DEFAULT_SETTLE_SECONDS:g})")
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL_SECONDS,
+                        help=f"Seconds between looks at the watched folder (default: {DEFAULT_POLL_SECONDS:g})")
+    parser.add_argument("--queue-size", type=int,
+                        help="Settled videos allowed to wait for a worker in --watch mode (default: 2 x --jobs)")
+    parser.add_argument("--journal", type=str,
+                        help=f"Job journal used to resume a batch after a crash (default: <input file>.journal for -f, "
+                             f"<watched folder>/{TEMP_PREFIX}watch.journal for --watch, none for -i)")
+    parser.add_argument("--metrics", type=str,
+                        help="File for per-video stage timings, frame rate, bytes in/out and peak memory")
+    parser.add_argument("--metrics-format", type=str, choices=METRICS_FORMATS, default="jsonl",
+                        help="jsonl appends one record per video; prometheus keeps batch totals in a text file for "
+                             "node_exporter's textfile collector (default: jsonl)")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of videos to process in parallel (default: 1)")
+    parser.add_argument("--segments", type=int, default=1,
+                        help="Split a video that is re-encoded into up to this many parts at keyframes, encode them in "
+                             "parallel and join them without re-encoding. Meant for single long recordings; parts are "
+                             f"at least {MIN_SEGMENT_SECONDS:g} seconds long (default: 1, no splitting)")
+    parser.add_argument("--probe-threads", type=int, default=DEFAULT_PROBE_THREADS,
+                        help=f"Videos probed at the same time before processing starts "
+                             f"(default: {DEFAULT_PROBE_THREADS})")
+    parser.add_argument("--preflight-batch", type=int, default=DEFAULT_PREFLIGHT_BATCH,
+                        help=f"Videos probed before each round of processing. Use a number larger than the batch to "
+                             f"get its totals before anything is processed (default: {DEFAULT_PREFLIGHT_BATCH})")
+    parser.add_argument("--probe-cache", type=str, default=DEFAULT_PROBE_CACHE_PATH,
+                        help=f"File caching container probes between runs (default: {DEFAULT_PROBE_CACHE_PATH})")
+    parser.add_argument("--quarantine", type=str,
+                        help="Folder that videos which cannot be processed are moved to (default: leave them)")
+    parser.add_argument("--output-cache", type=str, default=DEFAULT_OUTPUT_CACHE_DIR,
+                        help=f"Folder of earlier outputs, reused when the same video gets the same operations and "
+                             f"encoder settings again (default: {DEFAULT_OUTPUT_CACHE_DIR})")
+    parser.add_argument("--output-cache-size", type=float, default=DEFAULT_OUTPUT_CACHE_GB,
+                        help=f"Size in GB above which the least recently used outputs are removed from the cache "
+                             f"(default: {DEFAULT_OUTPUT_CACHE_GB:g})")
+    parser.add_argument("--no-cache", action="store_true", help="Always process the videos and leave the cache alone")
+    parser.add_argument("--contact-sheet", action="store_true",
+                        help="Also write a strip of thumbnails spread over each output as <output>_sheet.jpg")
+    parser.add_argument("--sheet-tiles", type=int, default=DEFAULT_SHEET_TILES,
+                        help=f"Thumbnails in a contact sheet (default: {DEFAULT_SHEET_TILES})")
+    parser.add_argument("--proxy", action="store_true",
+                        help="Also write a low-resolution, low-bitrate copy of each output as <output>_proxy.mp4")
+    parser.add_argument("--proxy-height", type=int, default=DEFAULT_PROXY_HEIGHT,
+                        help=f"Height of a proxy in pixels; smaller videos keep their size (default: "
+                             f"{DEFAULT_PROXY_HEIGHT})")
+    parser.add_argument("--proxy-bitrate", type=str, default=DEFAULT_PROXY_BITRATE,
+                        help=f"Video bitrate of a proxy (default: {DEFAULT_PROXY_BITRATE})")
+    parser.add_argument("--waveform", action="store_true",
+                        help="Also write a min/max summary of each output's audio as <output>_waveform.json, in the "
+                             "JSON format of the audiowaveform tool")
+    parser.add_argument("--log-file", type=str, default=DEFAULT_LOG_FILE,
+                        help=f"File the log is appended to (default: {DEFAULT_LOG_FILE})")
+    add_encoder_arguments(parser)
+
+
+def add_cut_arguments(parser):
+    parser.add_argument("--start", type=str, dest="trim_start",
+                        help="Keep the video from this time on, in seconds or [hours:]minutes:seconds (e.g., 1:05.5)")
+    parser.add_argument("--end", type=str, dest="trim_end", help="Keep the video up to this time")
+    parser.add_argument("--keep", type=str, dest="keep_ranges",
+                        help="Keep only these ranges and join them, e.g., \"0:05-1:20,2:00-\" (a range without an end "
+                             "runs to the end of the video). Cannot be combined with --start or --end.")
+    parser.add_argument("--concat", type=str,
+                        help="Also join the outputs, in the order the videos are listed or found, into this video. "
+                             "With no other operation the videos are joined as they are.")
+
+
+def exit_with_error(message):
+    logging.error(f"Error: {message}")
+    print(f"Error: {message}")
+    sys.exit(1)
+
+
+def run_from_args(args):
+    # Run the batch described by parsed command line arguments: -i, -f or --watch, the operations of the tool and
+    # the options of add_batch_arguments
+    logging.basicConfig(filename=args.log_file, level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if sum(1 for source in (args.i, args.f, args.watch) if source) > 1:
+        exit_with_error("Choose only one of input video, input file or watched folder.")
+
+    if not args.i and not args.f and not args.watch:
+        exit_with_error("Either input video, input file or watched folder must be specified.")
+
+    if args.watch and (not args.output_dir or not os.path.isdir(args.watch)):
+        exit_with_error("--watch needs an existing folder and an output location (-o).")
+
+    if args.watch and getattr(args, "concat", None):
+        exit_with_error("--concat joins the videos of a batch and cannot be used with --watch.")
+
+    try:
+        settings = batch_settings({name: getattr(args, name, None) for name in OPERATIONS},
+                                  {name: getattr(args, name) for name in DEFAULT_OPTIONS})
+    except ValueError as e:
+        exit_with_error(str(e))
+
+    metrics_writer = MetricsWriter(settings.metrics, settings.metrics_format) if settings.metrics else None
+
+    if args.watch:
+        # A watched folder runs for days, so its results are only journaled, never kept in memory
+        journal = Journal(settings.journal or os.path.join(args.watch, f"{TEMP_PREFIX}watch.journal"))
+        watch_folder(args.watch, settings, Batch(journal, metrics_writer, keep_results=False, keep_failed=False))
+        journal.close()
+        return
+
+    if args.i:
+        # Outputs written into -o are never picked up as inputs, even when -o is inside the input folder
+        discovered = discover_videos(args.i, VALID_EXTENSIONS, [settings.output_dir] if settings.output_dir else [])
+    else:
+        discovered = read_video_list(args.f, VALID_EXTENSIONS)
+
+    journal = None
+    if args.f or settings.journal:
+        journal = Journal(settings.journal or f"{args.f}.journal")
+
+    run_batch(discovered, settings, Batch(journal, metrics_writer, keep_results=False,
+                                          keep_outputs=bool(settings.concat)))
+
+    if journal:
+        journal.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Modify videos")
+    parser.add_argument("-db", type=float, dest="increase_db", metavar="DB", help="Volume increase in decibels")
+    parser.add_argument("-r", type=str, dest="rotation", choices=["left", "right"],
+                        help="Rotate a video by 90 degrees left or right.")
+    parser.add_argument("--rotation-mode", type=str, choices=["pixels", "metadata"], default="pixels",
+                        help="Rotate by re-encoding every frame (pixels) or losslessly by setting the container's "
+                             "display rotation (metadata). Use pixels for players that ignore the rotation tag.")
+    parser.add_argument("-v", type=float, dest="volume_multiplier", metavar="V",
+                        help="Volume multiplier for audio normalization (e.g., 1.0 for no change, "
+                             "Anything less than 1.0 will equalize the audio.)")
+    parser.add_argument("--lufs", type=float, dest="target_lufs", metavar="LUFS",
+                        help="Normalize the audio to a target integrated loudness in LUFS (e.g., -16). Cannot be "
+                             "combined with -db or -v.")
+    parser.add_argument("--true-peak", type=float, default=-1.0,
+                        help="True-peak ceiling in dBTP when normalizing with --lufs (default: -1.0)")
+    add_cut_arguments(parser)
+    add_batch_arguments(parser)
+
+    run_from_args(parser.parse_args())
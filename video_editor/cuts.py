@@ -0,0 +1,260 @@
+import os
+import re
+import math
+import subprocess
+from video_editor.stream_copy import (ffmpeg_binary, read_audio_format, read_display_rotation, read_video_format,
+                                      run_ffmpeg)
+
+# Codecs whose cut regions can be re-encoded to match the copied stream around them: the encoder, and the bitstream
+# filter that repeats the parameter sets in front of every copied keyframe. With the parameter sets in-band, parts
+# coming from different encoders can follow each other in one stream.
+SMART_CUT_CODECS = {"h264": ("libx264", "h264_mp4toannexb"), "hevc": ("libx265", "hevc_mp4toannexb")}
+
+# Regions around cuts sit between untouched frames, so without an explicit --crf or --bitrate they are encoded
+# close to visually lossless instead of at the encoder's default quality
+BOUNDARY_CRF = 18
+
+# Copies seek just past the keyframe they start at, so rounding never lands them on the keyframe before
+SEEK_MARGIN = 0.001
+
+
+def parse_time(text):
+    # Seconds ("75.5") or [hours:]minutes:seconds ("1:15.5", "1:01:15")
+    try:
+        seconds = 0.0
+        for part in str(text).strip().split(":"):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        raise ValueError(f"Invalid time: {text}")
+    if seconds < 0 or len(str(text).split(":")) > 3:
+        raise ValueError(f"Invalid time: {text}")
+    return seconds
+
+
+def parse_ranges(text):
+    # "0:05-1:20,2:00-" into [(5.0, 80.0), (120.0, None)]. A range without an end runs to the end of the video.
+    ranges = []
+    for part in str(text).split(","):
+        match = re.fullmatch(r"\s*([\d:.]*)\s*-\s*([\d:.]*)\s*", part)
+        if not match:
+            raise ValueError(f"Invalid range: {part.strip()} (expected START-END, e.g., 0:05-1:20)")
+        start = parse_time(match.group(1)) if match.group(1) else 0.0
+        end = parse_time(match.group(2)) if match.group(2) else None
+        if end is not None and end <= start:
+            raise ValueError(f"Invalid range: {part.strip()} ends before it starts")
+        ranges.append((start, end))
+    return ranges
+
+
+def cut_ranges(trim_start=None, trim_end=None, keep_ranges=None):
+    # The parts of the input to keep, from --start/--end or --keep, or None to keep the whole video. keep_ranges is
+    # a string like "0:05-1:20,2:00-" or, from Python, a list of (start, end) pairs.
+    if keep_ranges is not None and (trim_start is not None or trim_end is not None):
+        raise ValueError("--keep cannot be combined with --start or --end.")
+    if keep_ranges is not None:
+        if isinstance(keep_ranges, str):
+            return parse_ranges(keep_ranges)
+        return [kept for start, end in keep_ranges for kept in parse_ranges(f"{start}-{'' if end is None else end}")]
+    if trim_start is None and trim_end is None:
+        return None
+    start = parse_time(trim_start) if trim_start is not None else 0.0
+    end = parse_time(trim_end) if trim_end is not None else None
+    if end is not None and end <= start:
+        raise ValueError("--end must be after --start.")
+    return [(start, end)]
+
+
+def clip_ranges(ranges, duration, min_seconds=0.0):
+    # Sort the ranges, merge overlapping ones, clip them to the video and drop the ones no longer than min_seconds
+    # (e.g. shorter than a frame); empty if nothing of the video is kept
+    clipped = []
+    for start, end in sorted((start, duration if end is None else min(end, duration)) for start, end in ranges):
+        if end <= start:
+            continue
+        if clipped and start <= clipped[-1][1]:
+            clipped[-1] = (clipped[-1][0], max(clipped[-1][1], end))
+        else:
+            clipped.append((start, end))
+    return [(start, end) for start, end in clipped if end - start > min_seconds]
+
+
+def snap_ranges(ranges, fps):
+    # Move every cut onto the source's frame grid, to the first frame at or after it, so a range keeps exactly the
+    # frames from its start up to (not including) its end and the audio is cut at the same instants as the video
+    snapped = []
+    for start, end in ranges:
+        start, end = (math.ceil(time * fps - 1e-6) / fps for time in (start, end))
+        if end > start:
+            snapped.append((start, end))
+    return snapped
+
+
+def read_keyframes(input_path, start, end):
+    # Times of the keyframes of the first video stream between the keyframe at or before start and end. The
+    # packets are only read, not decoded: framecrc prints a line per packet and adds "F=" to all but keyframes.
+    command = [ffmpeg_binary(), "-loglevel", "error", "-ss", f"{start:.6f}"]
+    if end is not None:
+        command += ["-to", f"{end:.6f}"]
+    command += ["-copyts", "-start_at_zero", "-i", input_path, "-map", "0:v:0", "-c", "copy", "-f", "framecrc", "-"]
+    result = subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    keyframes = []
+    time_base = None
+    for line in result.stdout.decode(errors='replace').splitlines():
+        if line.startswith("#tb 0:"):
+            numerator, denominator = line.split(":", 1)[1].strip().split("/")
+            time_base = int(numerator) / int(denominator)
+        elif time_base and not line.startswith("#") and "F=" not in line:
+            keyframes.append(int(line.split(",")[2]) * time_base)
+    return sorted(keyframes)
+
+
+def plan_cut(start, end, keyframes, duration, tolerance):
+    # Split one kept range into the parts that can be copied (keyframe to keyframe, or keyframe to the end of the
+    # video) and the parts that have to be re-encoded (from a cut to the next keyframe, or from the last keyframe to
+    # a cut). Cuts within tolerance of a keyframe count as on it. Returns ("copy" or "encode", start, end) tuples; a
+    # copy with end None runs to the end of the video.
+    inside = [keyframe for keyframe in keyframes if start - tolerance <= keyframe < end - tolerance]
+    if not inside:
+        return [("encode", start, end)]
+
+    parts = []
+    first, last = inside[0], inside[-1]
+    if first - start > tolerance:
+        parts.append(("encode", start, first))
+    if end >= duration - tolerance:
+        parts.append(("copy", first, None))
+    elif any(abs(keyframe - end) <= tolerance for keyframe in keyframes):
+        parts.append(("copy", first, end))
+    else:
+        if last > first:
+            parts.append(("copy", first, last))
+        parts.append(("encode", last, end))
+
+    # A range without a whole GOP inside it is simply re-encoded in one piece
+    if all(kind == "encode" for kind, _, _ in parts):
+        return [("encode", start, end)]
+    return parts
+
+
+def copy_part(input_path, start, end, part_path, bitstream_filter):
+    # Copy the video stream from the keyframe at start up to the keyframe at end. The segment muxer only cuts at
+    # keyframes, so the first segment ends exactly where the next part begins.
+    pattern = f"{os.path.splitext(part_path)[0]}_%03d.mp4"
+    arguments = ["-ss", f"{start + SEEK_MARGIN:.6f}", "-i", input_path]
+    if end is not None:
+        arguments += ["-t", f"{end - start + 1:.6f}"]
+    arguments += ["-map", "0:v:0", "-c", "copy", "-bsf:v", bitstream_filter, "-f", "segment", "-segment_format", "mp4",
+                  "-reset_timestamps", "1"]
+    if end is not None:
+        arguments += ["-segment_times", f"{end - start - 2 * SEEK_MARGIN:.6f}"]
+    else:
+        arguments += ["-segment_time", "1000000000"]
+    run_ffmpeg(arguments + [pattern])
+    os.replace(pattern.replace("%03d", "000"), part_path)
+
+
+def encode_part(input_path, start, end, part_path, encoder, pix_fmt, encoder_settings, fps):
+    # Re-encode the frames from start up to (not including) end, both on the frame grid, with the same codec and pixel
+    # format as the copied parts, repeating the parameter sets in-band like they do. The seek lands half a frame
+    # early, so rounding never skips the frame at start, and the frames are counted rather than timed and keep their
+    # own timestamps, so none is duplicated to fill the gap to the seek point or dropped at the end.
+    arguments = ["-ss", f"{max(0.0, start - 0.5 / fps):.6f}", "-i", input_path, "-map", "0:v:0", "-an",
+                 "-fps_mode", "passthrough", "-frames:v", str(round((end - start) * fps)), "-c:v", encoder,
+                 "-pix_fmt", pix_fmt, "-preset", encoder_settings["preset"]]
+    if encoder_settings["bitrate"]:
+        arguments += ["-b:v", encoder_settings["bitrate"]]
+    else:
+        arguments += ["-crf", str(encoder_settings["crf"] if encoder_settings["crf"] is not None else BOUNDARY_CRF)]
+    if encoder_settings["threads"]:
+        arguments += ["-threads", str(encoder_settings["threads"])]
+    run_ffmpeg(arguments + ["-bsf:v", "dump_extra", part_path])
+
+
+def cut_video(input_path, ranges, duration, fps, video_format, work_dir, encoder_settings):
+    # Write the video stream of the kept ranges (snapped with snap_ranges) as parts in work_dir: copied where a part
+    # runs from keyframe to keyframe, re-encoded around cuts that do not land on one. Returns the part paths, in order.
+    encoder, bitstream_filter = SMART_CUT_CODECS[video_format[0]]
+    tolerance = 0.5 / fps
+    part_paths = []
+    for start, end in ranges:
+        keyframes = read_keyframes(input_path, start, None if end >= duration - tolerance else end + 2 * tolerance)
+        for kind, part_start, part_end in plan_cut(start, end, keyframes, duration, tolerance):
+            part_path = os.path.join(work_dir, f"part_{len(part_paths):05d}_{kind}.mp4")
+            if kind == "copy":
+                copy_part(input_path, part_start, part_end, part_path, bitstream_filter)
+            else:
+                encode_part(input_path, part_start, part_end, part_path, encoder, video_format[1], encoder_settings,
+                            fps)
+            part_paths.append(part_path)
+    return part_paths
+
+
+def write_concat_list(paths, work_dir):
+    list_path = os.path.join(work_dir, "parts.txt")
+    with open(list_path, 'w') as file:
+        for path in paths:
+            escaped_path = os.path.abspath(path).replace("'", "'\\''")
+            file.write(f"file '{escaped_path}'\n")
+    return list_path
+
+
+def join_cut(part_paths, input_path, ranges, output_path, work_dir, display_rotation=0.0, volume_multiplier=None,
+             audio_codec="aac", audio_bitrate=None, previews=None):
+    # Join the video parts without re-encoding them and cut the audio of the same ranges from the input, sample
+    # accurate and in one pass together with the gain. The audio is independent of the video's keyframes, so it is
+    # always re-encoded, which costs little next to video. previews (see previews.py) are written by the same pass.
+    arguments = ["-display_rotation:v:0", str(display_rotation), "-f", "concat", "-safe", "0",
+                 "-i", write_concat_list(part_paths, work_dir)]
+    preview_audio = []
+    if read_audio_format(input_path):
+        trims = "".join(f"[1:a:0]atrim=start={start:.6f}:end={end:.6f},asetpts=PTS-STARTPTS[a{index}];"
+                        for index, (start, end) in enumerate(ranges))
+        audio_filter = f"{trims}{''.join(f'[a{index}]' for index in range(len(ranges)))}concat=n={len(ranges)}:v=0:a=1"
+        if volume_multiplier is not None:
+            audio_filter += f",volume={volume_multiplier:.6f}"
+        # A filter's output can only be mapped once, so the previews that need the audio get copies of it
+        preview_audio = [f"[preview{index}]" for index in range(previews.audio_outputs() if previews else 0)]
+        if preview_audio:
+            audio_filter += f",asplit={len(preview_audio) + 1}"
+        arguments += ["-i", input_path, "-filter_complex", audio_filter + "[audio]" + "".join(preview_audio),
+                      "-map", "0:v:0",
+                      "-map", "[audio]", "-c:a", audio_codec]
+        if audio_bitrate:
+            arguments += ["-b:a", audio_bitrate]
+    else:
+        arguments += ["-map", "0:v:0"]
+    arguments += ["-c:v", "copy", output_path]
+    if previews:
+        previews.run_ffmpeg(arguments + previews.ffmpeg_outputs("0:v:0", preview_audio))
+    else:
+        run_ffmpeg(arguments)
+    return output_path
+
+
+def video_signature(path):
+    # What has to match for videos to follow each other in one stream without re-encoding
+    return read_video_format(path), read_audio_format(path), read_display_rotation(path)
+
+
+def join_videos(paths, output_path, work_dir):
+    # Concatenate whole videos without re-encoding. Their streams must match; the parameter sets are repeated in-band
+    # first, so videos from different encoders (e.g. copied and re-encoded outputs) can still be joined.
+    signature = video_signature(paths[0])
+    for path in paths[1:]:
+        if video_signature(path) != signature:
+            raise ValueError(f"{path} does not match the format of {paths[0]} (codec, pixel format, size, audio and "
+                             f"rotation must be the same to join without re-encoding)")
+
+    video_format, _, display_rotation = signature
+    bitstream_filter = SMART_CUT_CODECS[video_format[0]][1] if video_format[0] in SMART_CUT_CODECS else "null"
+    part_paths = []
+    for index, path in enumerate(paths):
+        part_path = os.path.join(work_dir, f"video_{index:05d}.mp4")
+        run_ffmpeg(["-i", path, "-map", "0:v:0", "-map", "0:a?", "-c", "copy", "-bsf:v", bitstream_filter, part_path])
+        part_paths.append(part_path)
+
+    run_ffmpeg(["-display_rotation:v:0", str(display_rotation), "-f", "concat", "-safe", "0",
+                "-i", write_concat_list(part_paths, work_dir), "-map", "0:v:0", "-map", "0:a?", "-c", "copy",
+                output_path])
+    return output_path
@@ -0,0 +1,93 @@
+import os
+import glob
+import time
+import logging
+
+# Temporary links and audio files written next to inputs and outputs while videos are processed
+TEMP_PREFIX = ".video_editor_"
+
+
+def is_glob(pattern):
+    return any(character in pattern for character in "*?[")
+
+
+def glob_root(pattern):
+    # The folder a glob pattern starts from, e.g. /videos for /videos/2024-*/**/*.mp4
+    parts = pattern.split(os.sep)
+    root_parts = []
+    for part in parts[:-1]:
+        if is_glob(part):
+            break
+        root_parts.append(part)
+    return os.sep.join(root_parts) or ("/" if pattern.startswith(os.sep) else ".")
+
+
+def walk_videos(directory, valid_extensions, skip_dirs=()):
+    # Depth-first walk that yields videos as soon as their folder has been read, so processing can start before a
+    # large tree has been listed. Each folder is read completely before its videos are yielded, so outputs written
+    # next to the inputs are never picked up as new inputs.
+    skip_dirs = {os.path.realpath(skip_dir) for skip_dir in skip_dirs}
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as scanned:
+                entries = sorted(scanned, key=lambda entry: entry.name)
+        except OSError as e:
+            logging.error(f"Error reading {current}: {str(e)}")
+            print(f"Error reading {current}: {str(e)}")
+            continue
+
+        subdirectories = []
+        for entry in entries:
+            if entry.name.startswith(TEMP_PREFIX):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if os.path.realpath(entry.path) not in skip_dirs:
+                    subdirectories.append(entry.path)
+            elif os.path.splitext(entry.name)[1].lower() in valid_extensions:
+                yield entry.path
+        pending.extend(reversed(subdirectories))
+
+
+def discover_videos(input_pattern, valid_extensions, skip_dirs=()):
+    # Yield (video path, root folder) for a single file, every video under a folder, or every file matching a glob
+    # pattern (use ** to match any number of folders). The root folder is None for a single file.
+    if os.path.isdir(input_pattern):
+        for input_path in walk_videos(input_pattern, valid_extensions, skip_dirs):
+            yield input_path, input_pattern
+        return
+
+    # A file that exists is taken literally, even when its name contains glob characters such as [ and ]
+    if os.path.exists(input_pattern) or not is_glob(input_pattern):
+        yield input_pattern, None
+        return
+
+    # glob reads folders lazily, so outputs written next to the inputs could match the pattern later in the same run.
+    # Any file created or linked after discovery started is left for the next run.
+    started = time.time()
+    root = glob_root(input_pattern)
+    skip_dirs = [os.path.realpath(skip_dir) + os.sep for skip_dir in skip_dirs]
+    for input_path in glob.iglob(input_pattern, recursive=True):
+        if os.path.basename(input_path).startswith(TEMP_PREFIX) or os.path.isdir(input_path):
+            continue
+        if os.path.splitext(input_path)[1].lower() not in valid_extensions:
+            continue
+        if any(os.path.realpath(input_path).startswith(skip_dir) for skip_dir in skip_dirs):
+            continue
+        try:
+            if os.stat(input_path).st_ctime >= started:
+                continue
+        except OSError:
+            continue
+        yield input_path, root
+
+
+def read_video_list(list_path, valid_extensions):
+    # Yield the videos listed in a file one line at a time, leaving out lines with non-video extensions. The file
+    # itself is never rewritten.
+    with open(list_path, 'r') as file:
+        for line in file:
+            input_path = line.strip()
+            if os.path.splitext(input_path)[1].lower() in valid_extensions:
+                yield input_path, None
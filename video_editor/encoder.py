@@ -0,0 +1,94 @@
+import os
+import json
+
+CONTAINERS = ["mp4", "mkv", "mov"]
+
+DEFAULT_ENCODER_SETTINGS = {
+    "codec": "libx264",
+    "audio_codec": "aac",
+    "preset": "medium",
+    "crf": None,
+    "bitrate": None,
+    "audio_bitrate": None,
+    "threads": os.cpu_count(),  # ffmpeg would otherwise be started by moviepy without a thread count
+    "container": None,  # Keep the input's extension
+}
+
+# Named profiles only override the settings they care about
+ENCODER_PROFILES = {
+    "fast-archive": {"preset": "veryfast", "crf": 28, "audio_bitrate": "96k"},
+    "max-quality": {"preset": "slow", "crf": 17, "audio_bitrate": "256k"},
+}
+
+# Command line options that override the profile and the config file when given
+ENCODER_OPTIONS = ["preset", "crf", "bitrate", "audio_bitrate", "threads", "container"]
+
+
+def add_encoder_arguments(parser):
+    parser.add_argument("--profile", type=str,
+                        help=f"Named encoder profile: {', '.join(ENCODER_PROFILES)}, or one defined in the config file")
+    parser.add_argument("--encoder-config", type=str,
+                        help="JSON file with encoder settings, an optional \"profile\" and extra \"profiles\"")
+    parser.add_argument("--preset", type=str, help="x264 preset, e.g., veryfast, medium, slow (default: medium)")
+    parser.add_argument("--crf", type=int, help="Constant rate factor, lower is better quality (e.g., 23)")
+    parser.add_argument("--bitrate", type=str, help="Video bitrate, e.g., 5000k. Takes precedence over --crf")
+    parser.add_argument("--audio-bitrate", type=str, help="Audio bitrate, e.g., 192k")
+    parser.add_argument("--threads", type=int, help="Encoder threads (default: number of CPUs)")
+    parser.add_argument("--container", type=str, choices=CONTAINERS,
+                        help="Output container (default: same as the input)")
+
+
+def resolve_encoder_settings(args):
+    # Settings are layered: defaults, then the profile, then the config file, then explicit command line options
+    config = {}
+    encoder_config = getattr(args, "encoder_config", None)
+    if encoder_config:
+        with open(encoder_config, 'r') as file:
+            config = json.load(file)
+
+    profiles = dict(ENCODER_PROFILES)
+    profiles.update(config.pop("profiles", {}))
+    profile = getattr(args, "profile", None) or config.pop("profile", None)
+    config.pop("profile", None)
+
+    unknown_settings = set(config) - set(DEFAULT_ENCODER_SETTINGS)
+    if unknown_settings:
+        raise ValueError(f"Unknown encoder settings in {encoder_config}: {', '.join(sorted(unknown_settings))}")
+
+    settings = dict(DEFAULT_ENCODER_SETTINGS)
+    if profile:
+        if profile not in profiles:
+            raise ValueError(f"Unknown encoder profile {profile}. Choose one of: {', '.join(profiles)}")
+        settings.update(profiles[profile])
+    settings.update(config)
+
+    for option in ENCODER_OPTIONS:
+        value = getattr(args, option, None)
+        if value is not None:
+            settings[option] = value
+
+    if settings["container"] and settings["container"] not in CONTAINERS:
+        raise ValueError(f"Unknown container {settings['container']}. Choose one of: {', '.join(CONTAINERS)}")
+
+    return settings
+
+
+def apply_container(extension, settings):
+    # Swap the output extension when a container was chosen
+    return f".{settings['container']}" if settings["container"] else extension
+
+
+def write_videofile_arguments(settings):
+    # Keyword arguments for moviepy's write_videofile
+    ffmpeg_params = []
+    if settings["crf"] is not None and not settings["bitrate"]:
+        ffmpeg_params = ["-crf", str(settings["crf"])]
+    return {
+        "codec": settings["codec"],
+        "audio_codec": settings["audio_codec"],
+        "preset": settings["preset"],
+        "bitrate": settings["bitrate"],
+        "audio_bitrate": settings["audio_bitrate"],
+        "threads": settings["threads"],
+        "ffmpeg_params": ffmpeg_params or None,
+    }
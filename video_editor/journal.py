@@ -0,0 +1,63 @@
+import os
+import json
+import time
+from video_editor.jsonl import load_latest
+
+# Every input moves through these states. A video still "running" when the journal is loaded was interrupted by a
+# crash or kill and is processed again, as are failed ones.
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Details that describe the input file rather than one state, carried over to every later entry of the same input
+SIGNATURE_FIELDS = ("size", "mtime_ns")
+
+
+def file_signature(input_path):
+    # Size and modification time, which change when a file is overwritten with new content; None if it is gone
+    try:
+        stat = os.stat(input_path)
+    except OSError:
+        return None
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class Journal:
+    # Append-only record of what happened to each input of a batch. Recording a state is one appended line, and the
+    # latest state of every input is kept in memory, so resuming costs O(1) per video and the user's list of paths
+    # is never rewritten.
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = load_latest(path, lambda entry: entry["path"])
+        self.file = open(path, 'a')
+
+    def state(self, input_path):
+        entry = self.entries.get(input_path)
+        return entry["state"] if entry else None
+
+    def is_done(self, input_path, signature):
+        # Whether the input was processed as it is now. Entries written before signatures were recorded cannot tell,
+        # so they count as done.
+        entry = self.entries.get(input_path)
+        if not entry or entry["state"] != DONE:
+            return False
+        if not all(name in entry for name in SIGNATURE_FIELDS):
+            return True
+        return signature is not None and all(entry[name] == signature[name] for name in SIGNATURE_FIELDS)
+
+    def record(self, input_path, state, sync=True, **details):
+        entry = {"path": input_path, "state": state, "timestamp": time.time()}
+        previous = self.entries.get(input_path, {})
+        entry.update({name: previous[name] for name in SIGNATURE_FIELDS if name in previous})
+        entry.update(details)
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+        if sync:
+            # Make sure the line survives a crash of the machine, not just of this process
+            os.fsync(self.file.fileno())
+        self.entries[input_path] = entry
+
+    def close(self):
+        self.file.close()
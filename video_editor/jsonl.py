@@ -0,0 +1,32 @@
+import os
+import json
+
+
+def parse_lines(lines):
+    # Yield the entries of append-only JSON lines, str or bytes, skipping a line cut short by a crash
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(entry, dict):
+            yield entry
+
+
+def load_latest(path, key):
+    # Read an append-only JSON lines file into a dict of the latest entry for every key(entry). Entries missing a
+    # field that key reads are skipped; a file that does not exist yet is empty.
+    entries = {}
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            for entry in parse_lines(file):
+                try:
+                    entries[key(entry)] = entry
+                except KeyError:
+                    continue
+    return entries
+
+
+def file_key(entry):
+    # Key of the caches that hold one entry per version of a file: its path, size and modification time
+    return (entry["path"], entry["size"], entry["mtime_ns"])
@@ -0,0 +1,158 @@
+import os
+import json
+import logging
+from video_editor.jsonl import file_key, load_latest
+from video_editor.stream_copy import DEFAULT_AUDIO_CHUNK_SECONDS, read_audio_blocks, read_audio_format
+
+# ITU-R BS.1770 loudness measurement. Audio is always decoded at 48 kHz so the standard filter coefficients apply.
+SAMPLE_RATE = 48000
+SUB_BLOCK_SAMPLES = SAMPLE_RATE // 10  # 100 ms, the step between overlapping 400 ms gating blocks
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+# K-weighting: a high shelf followed by the RLB high-pass, both as (b, a) biquad coefficients at 48 kHz
+K_WEIGHTING_STAGES = [
+    ([1.53512485958697, -2.69169618940638, 1.19839281085285], [1.0, -1.69065929318241, 0.73248077421585]),
+    ([1.0, -2.0, 1.0], [1.0, -1.99004745483398, 0.99007225036621]),
+]
+K_WEIGHTING_TAPS = 4096  # The filter's impulse response has decayed below -180 dB by then
+
+TRUE_PEAK_OVERSAMPLING = 4
+TRUE_PEAK_TAPS_PER_PHASE = 12
+
+DEFAULT_CACHE_PATH = 'loudness_cache.jsonl'
+
+# Measurements already loaded from a cache file, by cache path
+_loaded_caches = {}
+
+
+def k_weighting_impulse_response():
+    # Evaluate the cascaded biquads' frequency response and turn it into an FIR filter, so the whole signal can be
+    # filtered with vectorized FFT convolution instead of a per-sample recursive loop
+    import numpy as np
+    fft_size = K_WEIGHTING_TAPS * 8
+    z = np.exp(-2j * np.pi * np.arange(fft_size // 2 + 1) / fft_size)
+    response = np.ones_like(z)
+    for b, a in K_WEIGHTING_STAGES:
+        response *= np.polyval(b[::-1], z) / np.polyval(a[::-1], z)
+    return np.fft.irfft(response, fft_size)[:K_WEIGHTING_TAPS]
+
+
+def true_peak_phases():
+    # Windowed-sinc interpolation filter, split into one sub-filter per oversampled position between two samples
+    import numpy as np
+    taps = TRUE_PEAK_OVERSAMPLING * TRUE_PEAK_TAPS_PER_PHASE
+    t = (np.arange(taps) - (taps - 1) / 2) / TRUE_PEAK_OVERSAMPLING
+    interpolation_filter = np.sinc(t) * np.kaiser(taps, 8.0)
+    return [interpolation_filter[phase::TRUE_PEAK_OVERSAMPLING] for phase in range(TRUE_PEAK_OVERSAMPLING)]
+
+
+def measure_loudness(input_path, chunk_seconds=DEFAULT_AUDIO_CHUNK_SECONDS):
+    # numpy is imported where it is needed, so command line front ends start without it
+    import numpy as np
+    audio_format = read_audio_format(input_path)
+    if audio_format is None:
+        raise ValueError(f"No audio stream found in {input_path}")
+    # Surround layouts are folded down to stereo, which keeps the measurement close to BS.1770 for typical footage
+    channels = 1 if audio_format[1] == 1 else 2
+    chunk_samples = max(1, int(chunk_seconds * SAMPLE_RATE))
+
+    k_weighting = k_weighting_impulse_response()
+    fft_size = 1 << int(np.ceil(np.log2(chunk_samples + K_WEIGHTING_TAPS - 1)))
+    k_weighting_spectrum = np.fft.rfft(k_weighting, fft_size)
+    phases = true_peak_phases()
+    history = TRUE_PEAK_TAPS_PER_PHASE - 1
+
+    filter_tail = np.zeros((K_WEIGHTING_TAPS - 1, channels))
+    peak_history = np.zeros((history, channels))
+    pending = np.zeros((0, channels))
+    sub_block_powers = []
+    peak = 0.0
+
+    for block in read_audio_blocks(input_path, SAMPLE_RATE, channels, chunk_samples):
+        samples = block.astype(np.float64)
+
+        # True peak: interpolate between samples, carrying the previous block's last samples across the boundary
+        extended = np.concatenate([peak_history, samples])
+        peak = max(peak, float(np.abs(samples).max()))
+        for phase in phases:
+            for channel in range(channels):
+                interpolated = np.convolve(extended[:, channel], phase, mode='valid')
+                peak = max(peak, float(np.abs(interpolated).max(initial=0.0)))
+        peak_history = extended[-history:]
+
+        # K-weighting by overlap-add FFT convolution
+        filtered = np.fft.irfft(np.fft.rfft(samples, fft_size, axis=0) * k_weighting_spectrum[:, None],
+                                fft_size, axis=0)[:len(samples) + K_WEIGHTING_TAPS - 1]
+        filtered[:K_WEIGHTING_TAPS - 1] += filter_tail
+        filter_tail = filtered[len(samples):].copy()
+        filtered = np.concatenate([pending, filtered[:len(samples)]])
+
+        # Mean square of each complete 100 ms sub-block, per channel
+        complete = len(filtered) - len(filtered) % SUB_BLOCK_SAMPLES
+        sub_blocks = filtered[:complete].reshape(-1, SUB_BLOCK_SAMPLES, channels)
+        sub_block_powers.append(np.mean(sub_blocks ** 2, axis=1))
+        pending = filtered[complete:]
+
+    powers = np.concatenate(sub_block_powers) if sub_block_powers else np.zeros((0, channels))
+    return {
+        "integrated_lufs": gated_loudness(powers),
+        "true_peak_dbtp": float(20 * np.log10(peak)) if peak > 0 else None,
+    }
+
+
+def gated_loudness(sub_block_powers):
+    # 400 ms gating blocks overlap by 75%, i.e. each block is four consecutive 100 ms sub-blocks
+    import numpy as np
+    if len(sub_block_powers) < 4:
+        return None
+    block_powers = (sub_block_powers[:-3] + sub_block_powers[1:-2] + sub_block_powers[2:-1] + sub_block_powers[3:]) / 4
+    block_powers = block_powers.sum(axis=1)  # Channel weights are 1.0 for mono and stereo
+
+    with np.errstate(divide='ignore'):
+        block_loudness = -0.691 + 10 * np.log10(block_powers)
+
+    gated = block_powers[block_loudness > ABSOLUTE_GATE_LUFS]
+    if len(gated) == 0:
+        return None  # Silence
+
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE_LU
+    gated = block_powers[block_loudness > max(ABSOLUTE_GATE_LUFS, relative_gate)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def load_loudness_cache(cache_path):
+    if cache_path not in _loaded_caches:
+        _loaded_caches[cache_path] = load_latest(cache_path, file_key)
+    return _loaded_caches[cache_path]
+
+
+def measure_loudness_cached(input_path, cache_path=DEFAULT_CACHE_PATH, chunk_seconds=DEFAULT_AUDIO_CHUNK_SECONDS):
+    # Measurements are keyed by path, size and modification time, so an edited file is measured again. The cache is
+    # append-only JSON lines, which lets parallel workers share it without rewriting each other's entries.
+    stat = os.stat(input_path)
+    key = (os.path.realpath(input_path), stat.st_size, stat.st_mtime_ns)
+    cache = load_loudness_cache(cache_path)
+
+    if key not in cache:
+        entry = {"path": key[0], "size": key[1], "mtime_ns": key[2]}
+        entry.update(measure_loudness(input_path, chunk_seconds))
+        with open(cache_path, 'a') as file:
+            file.write(json.dumps(entry) + '\n')
+        cache[key] = entry
+        logging.info(f"Measured {input_path}: {entry['integrated_lufs']} LUFS, {entry['true_peak_dbtp']} dBTP")
+
+    return cache[key]
+
+
+def loudness_multiplier(input_path, target_lufs, true_peak_ceiling, cache_path=DEFAULT_CACHE_PATH,
+                        chunk_seconds=DEFAULT_AUDIO_CHUNK_SECONDS):
+    # Linear gain that brings the file to the target integrated loudness without its true peak exceeding the ceiling
+    entry = measure_loudness_cached(input_path, cache_path, chunk_seconds)
+    if entry["integrated_lufs"] is None:
+        return 1.0  # Leave silent audio alone rather than amplifying noise
+
+    gain_db = target_lufs - entry["integrated_lufs"]
+    if entry["true_peak_dbtp"] is not None:
+        gain_db = min(gain_db, true_peak_ceiling - entry["true_peak_dbtp"])
+    return 10 ** (gain_db / 20.0)
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import resource
+from contextlib import contextmanager
+
+METRICS_FORMATS = ["jsonl", "prometheus"]
+
+
+class Metrics:
+    # Timings and counters for one video. Stage times add up when a stage runs more than once, e.g. the rotation
+    # of every frame.
+
+    def __init__(self, input_path=None):
+        self.input_path = input_path
+        self.stages = {}
+        self.values = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def timed(self, name, function):
+        # Wrap a per-frame or per-chunk callback so the time spent in it is added to a stage
+        def timed_function(*args):
+            started = time.perf_counter()
+            result = function(*args)
+            self.add_time(name, time.perf_counter() - started)
+            return result
+        return timed_function
+
+    def count(self, name, amount=1):
+        self.values[name] = self.values.get(name, 0) + amount
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def as_dict(self):
+        total_seconds = self.values.get("total_seconds")
+        frames = self.values.get("frames")
+        record = {"timestamp": time.time(), "input": self.input_path}
+        record.update(self.values)
+        record["stages"] = {name: round(seconds, 4) for name, seconds in self.stages.items()}
+        record["fps"] = round(frames / total_seconds, 2) if frames and total_seconds else None
+        # Peak resident memory of this process and of its finished ffmpeg children so far, in bytes
+        record["peak_rss_bytes"] = 1024 * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                                              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        return record
+
+
+class MetricsWriter:
+    # Writes one record per video, either appended as a JSON line or folded into batch totals in a Prometheus text
+    # file (e.g. for node_exporter's textfile collector), which is replaced atomically after every video.
+
+    def __init__(self, path, metrics_format="jsonl"):
+        self.path = path
+        self.metrics_format = metrics_format
+        self.videos = {}
+        self.stage_seconds = {}
+        self.totals = {"frames": 0, "seconds": 0.0, "bytes_in": 0, "bytes_out": 0}
+        self.last = {}
+        self.preflight = None
+
+    def write(self, record):
+        if self.metrics_format == "jsonl":
+            with open(self.path, 'a') as file:
+                file.write(json.dumps(record) + '\n')
+            return
+
+        self.videos[record["status"]] = self.videos.get(record["status"], 0) + 1
+        for stage, seconds in record["stages"].items():
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+        self.totals["frames"] += record.get("frames") or 0
+        self.totals["seconds"] += record.get("total_seconds") or 0.0
+        self.totals["bytes_in"] += record.get("bytes_in") or 0
+        self.totals["bytes_out"] += record.get("bytes_out") or 0
+        if record.get("fps"):
+            self.last = record  # Gauges describe the last video that was processed successfully
+        self.write_prometheus()
+
+    def write_preflight(self, totals):
+        # What the batch adds up to according to the pre-flight rounds so far, written before any of their videos is
+        # processed. As a JSON line it is a record of its own, told apart from the videos' by its "preflight" field,
+        # and the last one holds the totals of the whole batch so far.
+        if self.metrics_format == "jsonl":
+            with open(self.path, 'a') as file:
+                file.write(json.dumps({"timestamp": time.time(), "preflight": totals}) + '\n')
+            return
+        self.preflight = dict(totals)
+        self.write_prometheus()
+
+    def write_prometheus(self):
+        lines = ["# HELP video_editor_videos_total Videos processed, by status",
+                 "# TYPE video_editor_videos_total counter"]
+        lines += [f'video_editor_videos_total{{status="{status}"}} {count}' for status, count in self.videos.items()]
+        lines += ["# HELP video_editor_stage_seconds_total Time spent in each processing stage",
+                  "# TYPE video_editor_stage_seconds_total counter"]
+        lines += [f'video_editor_stage_seconds_total{{stage="{stage}"}} {seconds:.4f}'
+                  for stage, seconds in self.stage_seconds.items()]
+        lines += ["# TYPE video_editor_frames_total counter",
+                  f"video_editor_frames_total {self.totals['frames']}",
+                  "# TYPE video_editor_processing_seconds_total counter",
+                  f"video_editor_processing_seconds_total {self.totals['seconds']:.4f}",
+                  "# TYPE video_editor_bytes_in_total counter",
+                  f"video_editor_bytes_in_total {self.totals['bytes_in']}",
+                  "# TYPE video_editor_bytes_out_total counter",
+                  f"video_editor_bytes_out_total {self.totals['bytes_out']}",
+                  "# HELP video_editor_last_fps Frames per second achieved on the last video",
+                  "# TYPE video_editor_last_fps gauge",
+                  f"video_editor_last_fps {self.last.get('fps') or 0}",
+                  "# TYPE video_editor_peak_rss_bytes gauge",
+                  f"video_editor_peak_rss_bytes {self.last.get('peak_rss_bytes') or 0}",
+                  "# TYPE video_editor_last_video_timestamp_seconds gauge",
+                  f"video_editor_last_video_timestamp_seconds {self.last.get('timestamp', 0):.3f}"]
+        if self.preflight:
+            lines += ["# HELP video_editor_preflight_videos Videos found by the pre-flight checks, by status",
+                      "# TYPE video_editor_preflight_videos gauge",
+                      f'video_editor_preflight_videos{{status="ready"}} {self.preflight["ready"]}',
+                      f'video_editor_preflight_videos{{status="rejected"}} {self.preflight["rejected"]}',
+                      "# HELP video_editor_preflight_seconds Duration of the videos ready to be processed",
+                      "# TYPE video_editor_preflight_seconds gauge",
+                      f"video_editor_preflight_seconds {self.preflight['seconds']:.3f}",
+                      "# TYPE video_editor_preflight_frames gauge",
+                      f"video_editor_preflight_frames {self.preflight['frames']}",
+                      "# TYPE video_editor_preflight_bytes gauge",
+                      f"video_editor_preflight_bytes {self.preflight['bytes']}"]
+
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, self.path)
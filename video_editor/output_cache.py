@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from video_editor.jsonl import file_key, load_latest, parse_lines
+
+DEFAULT_OUTPUT_CACHE_DIR = 'output_cache'
+DEFAULT_OUTPUT_CACHE_GB = 20.0
+HASH_BLOCK_SIZE = 1024 * 1024
+# Part of every key, so a change to what keys or stored outputs mean leaves the earlier outputs unused. Version 2:
+# content hashes of the whole input, and cuts whose metadata rotation is kept on every path.
+KEY_VERSION = 2
+# An over-full cache is brought down to this share of its size limit, so the stores after an eviction do not each
+# evict again
+EVICT_TO = 0.9
+
+# Content hashes already read by this process, by cache folder
+_loaded_hashes = {}
+# Usage logs read by this process so far, by cache folder
+_usage_logs = {}
+# (cache folder, device) pairs already warned about by this process
+_unlinkable_devices = set()
+
+
+class OutputCache:
+    # Finished outputs stored under a key made of the input's content hash, the operations and the encoder settings
+    # that change the output, so a repeated request is answered by hardlinking the earlier result. Outputs are never
+    # copied in or out, since a copy costs about as much I/O as the encode it saves. Content hashes are remembered by
+    # path, size and modification time, so an unchanged input is only read once. Once the cache grows past
+    # max_bytes, the least recently used outputs are removed.
+
+    def __init__(self, cache_dir=DEFAULT_OUTPUT_CACHE_DIR, max_bytes=DEFAULT_OUTPUT_CACHE_GB * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(cache_dir, "objects")
+        self.hashes_path = os.path.join(cache_dir, "hashes.jsonl")
+        self.usage_path = os.path.join(cache_dir, "usage.jsonl")
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+    def load_hashes(self):
+        if self.cache_dir not in _loaded_hashes:
+            # Hashes of an older key version are not the same hash of the file, so they are read but never used
+            entries = load_latest(self.hashes_path, lambda entry: file_key(entry) + (entry.get("version"),))
+            _loaded_hashes[self.cache_dir] = {key[:3]: entry["hash"] for key, entry in entries.items()
+                                              if key[3] == KEY_VERSION and "hash" in entry}
+        return _loaded_hashes[self.cache_dir]
+
+    def content_hash(self, input_path):
+        stat = os.stat(input_path)
+        key = (os.path.realpath(input_path), stat.st_size, stat.st_mtime_ns)
+        hashes = self.load_hashes()
+
+        if key not in hashes:
+            content_hash = hashlib.blake2b(digest_size=20)
+            with open(input_path, 'rb') as file:
+                for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+                    content_hash.update(block)
+            hashes[key] = content_hash.hexdigest()
+            with open(self.hashes_path, 'a') as file:
+                file.write(json.dumps({"path": key[0], "size": key[1], "mtime_ns": key[2], "hash": hashes[key],
+                                       "version": KEY_VERSION}) + '\n')
+
+        return hashes[key]
+
+    def links_to(self, folder):
+        # Whether outputs in folder can be hardlinked to and from the cache. A folder on another file system is left
+        # out of the cache, with one warning per process.
+        device = os.stat(folder).st_dev
+        if device == os.stat(self.cache_dir).st_dev:
+            return True
+        if (self.cache_dir, device) not in _unlinkable_devices:
+            _unlinkable_devices.add((self.cache_dir, device))
+            logging.warning(f"{folder} is on another file system than the output cache {self.cache_dir}, "
+                            f"so its outputs are not cached")
+            print(f"Warning: {folder} is on another file system than the output cache {self.cache_dir}, "
+                  f"so its outputs are not cached")
+        return False
+
+    def key(self, input_path, settings, extension):
+        description = json.dumps({"input": self.content_hash(input_path), "settings": settings,
+                                  "extension": extension, "version": KEY_VERSION}, sort_keys=True)
+        return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+    def derived_key(self, key, settings):
+        # Key of a file made together with the output of key, e.g. a preview, from the settings that change it
+        description = json.dumps({"output": key, "settings": settings}, sort_keys=True)
+        return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+    def object_path(self, key, extension):
+        return os.path.join(self.objects_dir, f"{key}{extension}")
+
+    def touch(self, key, size=None):
+        entry = {"key": key, "used": time.time()}
+        if size is not None:
+            entry["size"] = size
+        with open(self.usage_path, 'a') as file:
+            file.write(json.dumps(entry) + '\n')
+
+    def lookup(self, key, extension):
+        object_path = self.object_path(key, extension)
+        if not os.path.exists(object_path):
+            return None
+        self.touch(key)
+        return object_path
+
+    def store(self, key, extension, output_path):
+        # Link under a temporary name first, so parallel jobs never see a half-stored output
+        object_path = self.object_path(key, extension)
+        temp_path = f"{object_path}.{os.getpid()}.tmp"
+        os.link(output_path, temp_path)
+        os.replace(temp_path, object_path)
+        self.touch(key, os.path.getsize(object_path))
+        self.evict()
+
+    def usage_log(self):
+        if self.cache_dir not in _usage_logs:
+            _usage_logs[self.cache_dir] = UsageLog(self.usage_path, self.objects_dir)
+        return _usage_logs[self.cache_dir]
+
+    def evict(self):
+        # The usage log tracks the size of the cache, so the objects folder is only listed once it is too big
+        usage_log = self.usage_log()
+        usage_log.read()
+        if usage_log.total_bytes <= self.max_bytes:
+            return
+        last_used = usage_log.last_used
+
+        objects = []
+        for entry in os.scandir(self.objects_dir):
+            if entry.name.endswith(".tmp"):
+                continue
+            key = os.path.splitext(entry.name)[0]
+            stat = entry.stat()
+            objects.append((last_used.get(key, stat.st_mtime), key, entry.path, stat.st_size))
+
+        total_bytes = sum(size for _, _, _, size in objects)
+        if total_bytes <= self.max_bytes:
+            # Outputs removed by hand made the log overstate the size
+            usage_log.sizes = {key: size for _, key, _, size in objects}
+            usage_log.total_bytes = total_bytes
+            return
+
+        objects.sort()
+        evicted = set()
+        for _, key, object_path, size in objects:
+            if total_bytes <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(object_path)
+            except FileNotFoundError:
+                pass  # Already evicted by a parallel job
+            total_bytes -= size
+            evicted.add(key)
+        logging.info(f"Evicted {len(evicted)} outputs from {self.cache_dir}")
+
+        # Compact the usage log down to the outputs that are still cached, with their sizes
+        kept = [(used, key, size) for used, key, _, size in objects if key not in evicted]
+        temp_path = f"{self.usage_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as file:
+            for used, key, size in kept:
+                file.write(json.dumps({"key": key, "used": used, "size": size}) + '\n')
+        stat = os.stat(temp_path)
+        os.replace(temp_path, self.usage_path)
+        usage_log.reset(stat, {key: size for _, key, size in kept}, {key: used for used, key, _ in kept})
+
+
+class UsageLog:
+    # Last use and size of every cached output, from the append-only usage log of a cache. Only the lines added
+    # since the last read (by this process or a parallel one) are read, so checking the size after every store
+    # does not read the whole log again. A compaction replaces the file, which is then read from the start, with
+    # the sizes of outputs stored before sizes were logged taken from the objects folder.
+
+    def __init__(self, usage_path, objects_dir):
+        self.usage_path = usage_path
+        self.objects_dir = objects_dir
+        self.inode = None
+        self.offset = 0
+        self.last_used = {}
+        self.sizes = {}
+        self.total_bytes = 0
+
+    def read(self):
+        try:
+            stat = os.stat(self.usage_path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.reset(stat, {os.path.splitext(entry.name)[0]: entry.stat().st_size
+                              for entry in os.scandir(self.objects_dir) if not entry.name.endswith(".tmp")})
+        if stat is None:
+            return
+
+        with open(self.usage_path, 'rb') as file:
+            file.seek(self.offset)
+            data = file.read()
+        # A line still being written by a parallel job is left for the next read
+        complete = data[:data.rfind(b'\n') + 1]
+        self.offset += len(complete)
+        for entry in parse_lines(complete.splitlines()):
+            try:
+                self.last_used[entry["key"]] = max(entry["used"], self.last_used.get(entry["key"], 0))
+                if "size" in entry:
+                    self.total_bytes += entry["size"] - self.sizes.get(entry["key"], 0)
+                    self.sizes[entry["key"]] = entry["size"]
+            except (ValueError, KeyError):
+                continue
+
+    def reset(self, stat, sizes, last_used=None):
+        # Start over from the log file of stat and the sizes of the cached outputs: from the beginning of the file,
+        # or from its end when last_used already holds what it says
+        self.inode = stat.st_ino if stat else None
+        self.offset = stat.st_size if stat and last_used is not None else 0
+        self.last_used = last_used or {}
+        self.sizes = sizes
+        self.total_bytes = sum(sizes.values())
+
@@ -0,0 +1,409 @@
+import os
+import uuid
+import shutil
+import logging
+import tempfile
+import subprocess
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from video_editor.stream_copy import (DEFAULT_AUDIO_CHUNK_SECONDS, db_to_multiplier, display_rotation,
+                                      read_audio_format, read_video_format, stream_copy)
+from video_editor.loudness import DEFAULT_CACHE_PATH, loudness_multiplier
+from video_editor.encoder import DEFAULT_ENCODER_SETTINGS, resolve_encoder_settings, write_videofile_arguments
+from video_editor.metrics import Metrics
+from video_editor.segments import join_segments, segment_count, split_at_keyframes
+from video_editor.cuts import SMART_CUT_CODECS, clip_ranges, cut_ranges, cut_video, join_cut, snap_ranges
+from video_editor.previews import Previews, SegmentPreviews, preview_settings
+
+
+def run_segment(pipeline, input_path, output_path, previews=None):
+    # Unit of work sent to the worker processes of a segmented run. previews (see previews.SegmentPreviews) are
+    # sent back with the output, holding the segment's part of the contact sheet and proxy.
+    return pipeline.run(input_path, output_path, previews=previews), previews
+
+
+class Pipeline:
+    # The requested operations fused into a single pass over a video: one decode, one combined video transform,
+    # one combined audio gain and one encode. When no frame has to change, the video stream is copied instead, and
+    # cuts only re-encode the frames between a cut and the nearest keyframe. Previews of the output are made during
+    # that same pass.
+
+    def __init__(self, rotation=None, rotation_mode="pixels", increase_db=None, volume_multiplier=None,
+                 target_lufs=None, true_peak=-1.0, loudness_cache=DEFAULT_CACHE_PATH,
+                 audio_chunk=DEFAULT_AUDIO_CHUNK_SECONDS, encoder_settings=None, segments=1, keep_ranges=None,
+                 preview_settings=None):
+        self.rotation = rotation
+        self.rotation_mode = rotation_mode
+        self.increase_db = increase_db
+        self.volume_multiplier = volume_multiplier
+        self.target_lufs = target_lufs
+        self.true_peak = true_peak
+        self.loudness_cache = loudness_cache
+        self.audio_chunk = audio_chunk
+        self.encoder_settings = encoder_settings or dict(DEFAULT_ENCODER_SETTINGS)
+        self.segments = segments
+        self.keep_ranges = keep_ranges  # (start, end) seconds of the input to keep, end None for the end of the video
+        self.preview_settings = preview_settings  # See previews.preview_settings
+
+    @classmethod
+    def from_args(cls, args):
+        # Each entry point only defines the options it supports
+        return cls(rotation=getattr(args, "rotation", None),
+                   rotation_mode=getattr(args, "rotation_mode", "pixels"),
+                   increase_db=getattr(args, "increase_db", None),
+                   volume_multiplier=getattr(args, "volume_multiplier", None),
+                   target_lufs=getattr(args, "target_lufs", None),
+                   true_peak=getattr(args, "true_peak", -1.0),
+                   loudness_cache=getattr(args, "loudness_cache", DEFAULT_CACHE_PATH),
+                   audio_chunk=getattr(args, "audio_chunk", DEFAULT_AUDIO_CHUNK_SECONDS),
+                   encoder_settings=resolve_encoder_settings(args),
+                   segments=getattr(args, "segments", 1),
+                   keep_ranges=cut_ranges(getattr(args, "trim_start", None), getattr(args, "trim_end", None),
+                                          getattr(args, "keep_ranges", None)),
+                   preview_settings=preview_settings(args))
+
+    @property
+    def rotation_angle(self):
+        if not self.rotation:
+            return None
+        return 90 if self.rotation == "left" else -90  # Rotate left: 90 degrees, Rotate right: -90 degrees
+
+    @property
+    def changes_audio(self):
+        return bool(self.increase_db or self.volume_multiplier or self.target_lufs is not None)
+
+    @property
+    def changes_pixels(self):
+        return bool(self.rotation) and self.rotation_mode == "pixels"
+
+    def operation_tags(self):
+        operation_tags = []
+        if self.rotation:
+            operation_tags.append("ROTATED_" + self.rotation.upper())
+        if self.increase_db:
+            operation_tags.append(f"INCREASED_{self.increase_db}DB")
+        if self.volume_multiplier:
+            operation_tags.append(f"NORMALIZED_{self.volume_multiplier}")
+        if self.target_lufs is not None:
+            operation_tags.append(f"LOUDNORM_{self.target_lufs}LUFS")
+        if self.keep_ranges:
+            # Long lists of ranges would crowd out the file name
+            if len(self.keep_ranges) > 3:
+                operation_tags.append(f"CUT_{len(self.keep_ranges)}_RANGES")
+            else:
+                operation_tags.append("CUT_" + "_".join(f"{start:g}-{'END' if end is None else f'{end:g}'}"
+                                                        for start, end in self.keep_ranges))
+        return operation_tags
+
+    def cache_settings(self):
+        # Everything that changes the output for a given input, and nothing else (e.g. not the thread count), so
+        # the output cache can tell when a request was already done
+        settings = {}
+        if self.rotation:
+            settings.update(rotation=self.rotation, rotation_mode=self.rotation_mode)
+        if self.increase_db:
+            settings["increase_db"] = self.increase_db
+        if self.volume_multiplier:
+            settings["volume_multiplier"] = self.volume_multiplier
+        if self.target_lufs is not None:
+            settings.update(target_lufs=self.target_lufs, true_peak=self.true_peak)
+        if self.keep_ranges:
+            settings["keep_ranges"] = self.keep_ranges
+
+        encoder_settings = []
+        if self.changes_audio:
+            encoder_settings += ["audio_codec", "audio_bitrate"]
+        if self.changes_pixels or self.keep_ranges:
+            encoder_settings += ["codec", "audio_codec", "audio_bitrate", "preset", "crf", "bitrate"]
+        settings["encoder"] = {name: self.encoder_settings[name] for name in encoder_settings}
+        return settings
+
+    def audio_gain(self, input_path):
+        # Combine every audio operation into one linear gain, so the audio is scaled and re-encoded only once
+        if not self.changes_audio:
+            return None
+        if self.target_lufs is not None:
+            return loudness_multiplier(input_path, self.target_lufs, self.true_peak, self.loudness_cache,
+                                       self.audio_chunk)
+
+        gain = 1.0
+        if self.increase_db:
+            gain *= db_to_multiplier(self.increase_db)
+        if self.volume_multiplier:
+            gain *= self.volume_multiplier
+        return gain
+
+    def video_transform(self, encodes_every_frame=False):
+        # Combine every frame operation into one function, so each frame passes through a single Python callback.
+        # When every frame is re-encoded anyway (a cut of a codec that cannot be copied around the cuts), a metadata
+        # rotation is applied to the pixels too, as the encode does not carry a display rotation over.
+        if not (self.changes_pixels or (self.rotation and encodes_every_frame)):
+            return None
+        import numpy as np
+        quarter_turns = 1 if self.rotation_angle == 90 else -1
+        return lambda frame: np.rot90(frame, quarter_turns)
+
+    def start_previews(self, input_path, output_path, duration, has_video):
+        # Previews of an output whose audio comes from input_path through ffmpeg
+        if not self.preview_settings:
+            return None
+        audio_format = read_audio_format(input_path)
+        return Previews(output_path, self.preview_settings, duration, has_video,
+                        audio_format[1] if audio_format else None)
+
+    def finish_previews(self, previews, output_path, metrics):
+        # Write what is left of the previews once the output is done, or remove them when it failed. A preview
+        # that cannot be written is reported but does not fail the output.
+        if previews is None:
+            return output_path
+        if not output_path:
+            previews.discard()
+            return None
+        try:
+            with metrics.stage("previews"):
+                preview_paths = previews.finish(output_path)
+            if preview_paths:
+                logging.info(f"Previews of {output_path} saved as {', '.join(preview_paths)}")
+                print(f"Previews of {output_path} saved as {', '.join(preview_paths)}")
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Error writing previews of {output_path}: {e.stderr.decode(errors='replace').strip()}")
+            print(f"Error writing previews of {output_path}: {e.stderr.decode(errors='replace').strip()}")
+            previews.discard()
+        except OSError as e:
+            logging.error(f"Error writing previews of {output_path}: {str(e)}")
+            print(f"Error writing previews of {output_path}: {str(e)}")
+            previews.discard()
+        return output_path
+
+    def run(self, input_path, output_path, metrics=None, previews=None):
+        # Stage timings and frame counts are added to metrics when given. Stages nest: "encode" includes decoding
+        # and the per-frame "video_transform" and per-chunk "audio_gain" time, and the previews made from them.
+        # previews, when given, get the frames of the moviepy path instead of previews of this output, e.g. a
+        # segment's part of the previews of the whole video.
+
+        # Only the moviepy modules this needs, loaded on first use: moviepy.editor would also pull in IPython,
+        # the downloader and every effect
+        from moviepy.tools import find_extension
+        from moviepy.video.io.VideoFileClip import VideoFileClip
+        from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+        probe = metrics is not None
+        if metrics is None:
+            metrics = Metrics(input_path)
+
+        if probe and not self.changes_pixels and not self.keep_ranges and metrics.values.get("frames") is None:
+            # No frame passes through Python when the video stream is copied, so count them from the container
+            try:
+                with metrics.stage("probe"):
+                    metrics.set("frames", ffmpeg_parse_infos(input_path).get("video_nframes"))
+            except (OSError, IOError) as e:
+                logging.error(f"Error probing {input_path}: {str(e)}")
+                print(f"Error probing {input_path}: {str(e)}")
+                return None
+
+        try:
+            with metrics.stage("loudness") if self.target_lufs is not None else nullcontext():
+                gain = self.audio_gain(input_path)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error measuring loudness: {str(e)}")
+            print(f"Error measuring loudness: {str(e)}")
+            return None
+
+        ranges = None
+        if self.keep_ranges:
+            # Loudness is measured on the whole input: its gating ignores the silence a cut usually removes
+            try:
+                infos = ffmpeg_parse_infos(input_path)
+                video_format = read_video_format(input_path)
+            except (OSError, IOError) as e:
+                logging.error(f"Error probing {input_path}: {str(e)}")
+                print(f"Error probing {input_path}: {str(e)}")
+                return None
+            fps = infos.get("video_fps") or 25.0
+            ranges = snap_ranges(clip_ranges(self.keep_ranges, infos["duration"], 1.0 / fps), fps)
+            if not ranges:
+                logging.error(f"Error: No part of {input_path} is inside the ranges to keep")
+                print(f"Error: No part of {input_path} is inside the ranges to keep")
+                return None
+            # Other codecs, and frames that all change anyway, go through the full decode and encode below
+            if not self.changes_pixels and video_format and video_format[0] in SMART_CUT_CODECS:
+                metrics.set("frames", round(sum(end - start for start, end in ranges) * fps))
+                previews = self.start_previews(input_path, output_path, sum(end - start for start, end in ranges),
+                                               infos["video_found"])
+                return self.finish_previews(previews, self.run_cut(input_path, output_path, gain, ranges,
+                                                                   infos["duration"], fps, video_format, metrics,
+                                                                   previews), metrics)
+
+        if not self.changes_pixels and not ranges:
+            # Audio-only edits and metadata rotations copy the video stream untouched
+            previews = None
+            if self.preview_settings:
+                try:
+                    infos = ffmpeg_parse_infos(input_path)
+                except (OSError, IOError) as e:
+                    logging.error(f"Error probing {input_path}: {str(e)}")
+                    print(f"Error probing {input_path}: {str(e)}")
+                    return None
+                previews = self.start_previews(input_path, output_path, infos["duration"], infos["video_found"])
+            with metrics.stage("stream_copy"):
+                saved_path = stream_copy(input_path, output_path, volume_multiplier=gain,
+                                         rotation_angle=self.rotation_angle,
+                                         audio_codec=self.encoder_settings["audio_codec"],
+                                         chunk_seconds=self.audio_chunk,
+                                         audio_bitrate=self.encoder_settings["audio_bitrate"], previews=previews)
+            return self.finish_previews(previews, saved_path, metrics)
+
+        if self.segments > 1 and not ranges:
+            try:
+                infos = ffmpeg_parse_infos(input_path)
+            except (OSError, IOError) as e:
+                logging.error(f"Error probing {input_path}: {str(e)}")
+                print(f"Error probing {input_path}: {str(e)}")
+                return None
+            count = segment_count(infos["duration"], self.segments)
+            if count > 1:
+                metrics.set("frames", infos.get("video_nframes"))
+                previews = self.start_previews(input_path, output_path, infos["duration"], infos["video_found"])
+                return self.finish_previews(previews, self.run_segmented(input_path, output_path, gain,
+                                                                         infos["duration"] / count, count, metrics,
+                                                                         previews), metrics)
+
+        with metrics.stage("open"):
+            # moviepy resamples the audio to 44100 Hz, and its reader fails on chunks larger than its buffer
+            clip = VideoFileClip(input_path, audio_buffersize=max(200000, 2 * int(self.audio_chunk * 44100)))
+
+        # moviepy names its temporary audio file after the output, which can exceed the file name limit and
+        # collide between parallel jobs, so give it a short unique name next to the output instead
+        audio_extension = find_extension(self.encoder_settings["audio_codec"])
+        temp_audiofile = os.path.join(os.path.dirname(output_path),
+                                      f".video_editor_{uuid.uuid4().hex}_audio.{audio_extension}")
+        try:
+            # Cuts of codecs that cannot be copied around a cut are re-encoded without changing the frames, unless
+            # they are rotated
+            video_transform = metrics.timed("video_transform", self.video_transform(encodes_every_frame=True) or
+                                            (lambda frame: frame))
+
+            edited_clip = clip
+            if ranges:
+                from moviepy.video.compositing.concatenate import concatenate_videoclips
+                edited_clip = concatenate_videoclips([clip.subclip(start, end) for start, end in ranges])
+
+            # moviepy scales and writes the audio track in chunks of this many samples
+            audio_fps = clip.audio.fps if clip.audio else 44100
+
+            # The previews are made from the same frames and samples that are encoded
+            if previews is None and self.preview_settings:
+                previews = Previews(output_path, self.preview_settings, edited_clip.duration, True,
+                                    edited_clip.audio.nchannels if edited_clip.audio else None)
+
+            # moviepy transforms frame 0 once when the clip is set up, to learn its size, so only the frames read
+            # once the encode has started are counted and go to the previews
+            encoding = False
+
+            def transform_frame(frame):
+                transformed = video_transform(frame)
+                if encoding:
+                    metrics.count("frames")
+                    if previews:
+                        previews.add_frame(transformed, edited_clip.fps)
+                return transformed
+
+            processed_clip = edited_clip.fl_image(transform_frame)
+            if processed_clip.audio and (gain is not None or previews):
+                scale = metrics.timed("audio_gain", lambda samples: gain * samples) if gain is not None else None
+
+                def process_samples(get_frame, t):
+                    samples = scale(get_frame(t)) if scale else get_frame(t)
+                    if previews:
+                        previews.add_samples(samples, audio_fps)
+                    return samples
+
+                processed_clip = processed_clip.set_audio(processed_clip.audio.fl(process_samples, keep_duration=True))
+
+            encoding = True
+            with metrics.stage("encode"):
+                processed_clip.write_videofile(output_path, audio_bufsize=max(1, int(self.audio_chunk * audio_fps)),
+                                               temp_audiofile=temp_audiofile,
+                                               **write_videofile_arguments(self.encoder_settings))
+        except Exception as e:
+            logging.error(f"Error processing {input_path}: {str(e)}")
+            print(f"Error processing {input_path}: {str(e)}")
+            return self.finish_previews(previews, None, metrics)
+        finally:
+            # Close the original clip to free resources; moviepy only removes its temporary audio file on success
+            clip.close()
+            if os.path.exists(temp_audiofile):
+                os.remove(temp_audiofile)
+        return self.finish_previews(previews, output_path, metrics)
+
+    def run_cut(self, input_path, output_path, gain, ranges, duration, fps, video_format, metrics, previews=None):
+        # Keep only the ranges of the input. The video is copied from keyframe to keyframe and only re-encoded
+        # between a cut and the nearest keyframe; the audio is cut and gained in the same pass that joins the parts.
+        work_dir = tempfile.mkdtemp(prefix=".video_editor_", dir=os.path.dirname(output_path) or ".")
+        try:
+            with metrics.stage("cut"):
+                part_paths = cut_video(input_path, ranges, duration, fps, video_format, work_dir,
+                                       self.encoder_settings)
+            with metrics.stage("join"):
+                return join_cut(part_paths, input_path, ranges, output_path, work_dir,
+                                display_rotation(input_path, self.rotation_angle), gain,
+                                self.encoder_settings["audio_codec"], self.encoder_settings["audio_bitrate"], previews)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Error cutting {input_path}: {e.stderr.decode(errors='replace').strip()}")
+            print(f"Error cutting {input_path}: {e.stderr.decode(errors='replace').strip()}")
+            return None
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def run_segmented(self, input_path, output_path, gain, segment_seconds, count, metrics, previews=None):
+        # Split the video stream at keyframes, transform and encode the segments in parallel processes, then join
+        # them without re-encoding. The audio is taken from the original in one piece, so there are no gaps at the
+        # joins, and its gain is applied once at the end.
+        work_dir = tempfile.mkdtemp(prefix=".video_editor_", dir=os.path.dirname(output_path) or ".")
+        try:
+            with metrics.stage("split"):
+                segment_paths = split_at_keyframes(input_path, work_dir, segment_seconds)
+
+            # Every segment encoder gets its share of the threads; the segments carry no audio
+            threads = max(1, (self.encoder_settings["threads"] or 1) // count)
+            segment_pipeline = Pipeline(rotation=self.rotation, rotation_mode=self.rotation_mode,
+                                        encoder_settings=dict(self.encoder_settings, threads=threads))
+            processed_paths = [os.path.join(work_dir, f"processed_{index:05d}.mp4")
+                               for index in range(len(segment_paths))]
+            # The contact sheet and proxy are made from the frames the segments' workers encode, so the joined
+            # output is not decoded again for them
+            segment_previews = [None] * len(segment_paths)
+            if previews and previews.has_video and {"contact_sheet", "proxy"} & set(previews.paths):
+                # The segments follow each other in the output, so each starts where the ones before it add up to
+                from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+                durations = [ffmpeg_parse_infos(segment_path)["duration"] for segment_path in segment_paths]
+                segment_previews = [SegmentPreviews(processed_path, previews.settings, previews.duration,
+                                                    sum(durations[:index]))
+                                    for index, processed_path in enumerate(processed_paths)]
+            with metrics.stage("segments"):
+                with ProcessPoolExecutor(max_workers=count) as executor:
+                    results = list(executor.map(run_segment, [segment_pipeline] * len(segment_paths), segment_paths,
+                                                processed_paths, segment_previews))
+            failed = [saved_path for saved_path, _ in results].count(None)
+            if failed:
+                logging.error(f"Error processing {input_path}: {failed} segments failed")
+                print(f"Error processing {input_path}: {failed} segments failed")
+                return None
+            if segment_previews[0]:
+                with metrics.stage("previews"):
+                    previews.add_segments([segment for _, segment in results], work_dir)
+
+            with metrics.stage("join"):
+                if gain is None:
+                    return join_segments(processed_paths, input_path, output_path, work_dir, previews)
+                joined_path = os.path.join(work_dir, f"joined{os.path.splitext(output_path)[1]}")
+                join_segments(processed_paths, input_path, joined_path, work_dir)
+                return stream_copy(joined_path, output_path, volume_multiplier=gain,
+                                   audio_codec=self.encoder_settings["audio_codec"], chunk_seconds=self.audio_chunk,
+                                   audio_bitrate=self.encoder_settings["audio_bitrate"], previews=previews)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"Error processing {input_path} in segments: {e.stderr.decode(errors='replace').strip()}")
+            print(f"Error processing {input_path} in segments: {e.stderr.decode(errors='replace').strip()}")
+            return None
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
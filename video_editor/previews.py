@@ -0,0 +1,326 @@
+import os
+import json
+import math
+import uuid
+import logging
+import tempfile
+import subprocess
+from video_editor.stream_copy import ffmpeg_binary, run_ffmpeg
+
+# Previews written next to an output, named after it
+PREVIEW_KINDS = ["contact_sheet", "proxy", "waveform"]
+PREVIEW_SUFFIXES = {"contact_sheet": "_sheet.jpg", "proxy": "_proxy.mp4", "waveform": "_waveform.json"}
+
+DEFAULT_SHEET_TILES = 10
+THUMBNAIL_WIDTH = 160
+DEFAULT_PROXY_HEIGHT = 360
+DEFAULT_PROXY_BITRATE = "500k"
+PROXY_AUDIO_BITRATE = "64k"
+
+# A waveform is summarized into about this many min/max pairs, one per pixel of a full-width timeline
+WAVEFORM_POINTS = 2000
+# Rate of the audio ffmpeg hands over for the waveform, the same moviepy resamples to
+WAVEFORM_SAMPLE_RATE = 44100
+WAVEFORM_BLOCK_SAMPLES = 65536
+
+
+def preview_settings(args):
+    # The previews asked for and their sizes, or None when no preview is wanted
+    kinds = [kind for kind in PREVIEW_KINDS if getattr(args, kind, False)]
+    if not kinds:
+        return None
+    return {"kinds": kinds,
+            "sheet_tiles": getattr(args, "sheet_tiles", DEFAULT_SHEET_TILES),
+            "proxy_height": getattr(args, "proxy_height", DEFAULT_PROXY_HEIGHT),
+            "proxy_bitrate": getattr(args, "proxy_bitrate", DEFAULT_PROXY_BITRATE)}
+
+
+def preview_cache_settings(settings, kind):
+    # The settings that change one kind of preview, so the output cache can keep it next to the output
+    if kind == "contact_sheet":
+        return {"preview": kind, "sheet_tiles": settings["sheet_tiles"]}
+    if kind == "proxy":
+        return {"preview": kind, "proxy_height": settings["proxy_height"], "proxy_bitrate": settings["proxy_bitrate"]}
+    return {"preview": kind}
+
+
+def preview_extension(kind):
+    return os.path.splitext(PREVIEW_SUFFIXES[kind])[1]
+
+
+def preview_paths(output_path, kinds):
+    base = os.path.splitext(output_path)[0]
+    return {kind: base + PREVIEW_SUFFIXES[kind] for kind in kinds}
+
+
+def proxy_scale(height):
+    # Scale down to at most height lines, never up, keeping both sides even for yuv420p
+    return f"scale=-2:'min({height},trunc(ih/2)*2)'"
+
+
+class Waveform:
+    # Running min/max summary of the audio, mixed down to mono, in the JSON format of the audiowaveform tool
+    # (version 2, 16 bit) that players like peaks.js draw. Blocks of samples arrive in order and may be of any size.
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.sample_rate = None
+        self.samples_per_pixel = None
+        self.pending = None
+        self.pixels = []
+
+    def add(self, samples, sample_rate):
+        import numpy as np
+        if self.samples_per_pixel is None:
+            self.sample_rate = sample_rate
+            self.samples_per_pixel = max(1, math.ceil(self.duration * sample_rate / WAVEFORM_POINTS))
+            self.pending = np.zeros(0, dtype=np.float32)
+
+        mono = samples.mean(axis=1) if samples.ndim > 1 else samples
+        buffered = np.concatenate([self.pending, mono.astype(np.float32)])
+        whole = len(buffered) // self.samples_per_pixel * self.samples_per_pixel
+        if whole:
+            blocks = buffered[:whole].reshape(-1, self.samples_per_pixel)
+            self.pixels.append(np.stack([blocks.min(axis=1), blocks.max(axis=1)], axis=1))
+        self.pending = buffered[whole:]
+
+    def save(self, path):
+        # A video without audio gets an empty summary, so every output asked for has one
+        import numpy as np
+        if self.pending is not None and len(self.pending):
+            self.pixels.append(np.array([[self.pending.min(), self.pending.max()]]))
+        sample_rate = self.sample_rate or WAVEFORM_SAMPLE_RATE
+        samples_per_pixel = self.samples_per_pixel or max(1, math.ceil(self.duration * sample_rate / WAVEFORM_POINTS))
+        data = np.clip(np.round(np.concatenate(self.pixels).ravel() * 32767), -32768, 32767).astype(int).tolist() \
+            if self.pixels else []
+
+        with open(path, 'w') as file:
+            json.dump({"version": 2, "channels": 1, "sample_rate": sample_rate, "samples_per_pixel": samples_per_pixel,
+                       "bits": 16, "length": len(data) // 2, "data": data}, file)
+
+
+class Previews:
+    # Contact sheet, low-bitrate proxy and waveform of one output, made during its encode instead of by decoding
+    # the output again. On the moviepy path the frames and audio samples already pass through Python and are handed
+    # to add_frame and add_samples. When the video is copied or cut, nothing is decoded in Python, so the previews
+    # become extra outputs of the ffmpeg run that writes the output (ffmpeg_outputs), which reads the input once.
+
+    def __init__(self, output_path, settings, duration, has_video=True, audio_channels=None, start_time=0.0):
+        self.paths = preview_paths(output_path, settings["kinds"])
+        self.settings = settings
+        self.duration = duration
+        self.has_video = has_video
+        self.audio_channels = audio_channels  # None for a video without audio
+        self.start_time = start_time  # Time of the first frame handed over, for the segments of a segmented run
+        self.waveform = Waveform(duration) if "waveform" in self.paths else None
+        self.frame_index = 0
+        self.thumbnails = []
+        self.proxy_writer = None
+        self.proxy_errors = None
+        self.proxy_video_path = None
+        self.from_segments = False  # The contact sheet and proxy frames came from the segments (see add_segments)
+
+    def audio_outputs(self, waveform=True):
+        # Number of extra outputs that need the audio: the proxy, unless its frames came from the segments, and the
+        # waveform unless its samples are handed over in Python
+        if not self.audio_channels:
+            return 0
+        return ("proxy" in self.paths and not self.from_segments) + (waveform and self.waveform is not None)
+
+    def ffmpeg_outputs(self, video_map, audio_maps, waveform=True):
+        # ffmpeg output arguments for the previews, to be added after the main output. audio_maps has one audio
+        # source per output that needs it (see audio_outputs), or is empty for a video without audio. The waveform's
+        # samples come back on stdout, so run the command with run_ffmpeg below. They keep their channels: ffmpeg's
+        # own downmix would weigh them differently from the samples handed over in Python.
+        audio_maps = list(audio_maps)
+        arguments = []
+        if self.has_video and "contact_sheet" in self.paths and not self.from_segments:
+            # The first frame at or after the middle of each of tiles equal stretches, like add_frame picks them
+            step = self.duration / self.settings["sheet_tiles"]
+            arguments += ["-map", video_map, "-vf",
+                          f"select='gte(t,{step / 2:.6f}+{step:.6f}*selected_n)',scale={THUMBNAIL_WIDTH}:-2,"
+                          f"tile={self.settings['sheet_tiles']}x1",
+                          "-frames:v", "1", "-update", "1", self.paths["contact_sheet"]]
+        if (self.has_video or audio_maps) and "proxy" in self.paths and not self.from_segments:
+            if self.has_video:
+                arguments += ["-map", video_map, "-vf", proxy_scale(self.settings["proxy_height"]), "-c:v", "libx264",
+                              "-preset", "veryfast", "-b:v", self.settings["proxy_bitrate"], "-pix_fmt", "yuv420p"]
+            if audio_maps:
+                arguments += ["-map", audio_maps.pop(0), "-c:a", "aac", "-b:a", PROXY_AUDIO_BITRATE]
+            arguments += ["-movflags", "+faststart", self.paths["proxy"]]
+        if waveform and self.waveform is not None and audio_maps:
+            arguments += ["-map", audio_maps.pop(0), "-ac", str(self.audio_channels), "-ar", str(WAVEFORM_SAMPLE_RATE),
+                          "-f", "f32le", "pipe:1"]
+        return arguments
+
+    def run_ffmpeg(self, arguments):
+        # Like stream_copy.run_ffmpeg, while summarizing the waveform samples ffmpeg writes to stdout
+        if "pipe:1" not in arguments:
+            run_ffmpeg(arguments)
+            return
+
+        import numpy as np
+        command = [ffmpeg_binary(), "-y", "-loglevel", "error"] + arguments
+        with tempfile.TemporaryFile() as errors:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors)
+            try:
+                for data in iter(lambda: process.stdout.read(WAVEFORM_BLOCK_SAMPLES * self.audio_channels * 4), b''):
+                    self.waveform.add(np.frombuffer(data, dtype=np.float32).reshape(-1, self.audio_channels),
+                                      WAVEFORM_SAMPLE_RATE)
+                process.wait()
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+
+            if process.returncode != 0:
+                errors.seek(0)
+                raise subprocess.CalledProcessError(process.returncode, command, stderr=errors.read())
+
+    def add_frame(self, frame, fps):
+        # One output frame (height x width x RGB) of the moviepy path, in order
+        time = self.start_time + self.frame_index / fps
+        self.frame_index += 1
+
+        # Every tile shows the first frame at or after the middle of its stretch. Only the first frame can fill
+        # several: a segment's first frame also stands in for the tiles of the segments before it, of which
+        # add_segments keeps the earliest.
+        due = 0
+        if "contact_sheet" in self.paths:
+            tiles = self.settings["sheet_tiles"]
+            most = tiles - len(self.thumbnails) if self.frame_index == 1 else min(1, tiles - len(self.thumbnails))
+            while due < most and time >= (len(self.thumbnails) + due + 0.5) * self.duration / tiles:
+                due += 1
+        if due:
+            from PIL import Image
+            import numpy as np
+            height, width = frame.shape[:2]
+            thumbnail = Image.fromarray(np.ascontiguousarray(frame)).resize(
+                (THUMBNAIL_WIDTH, max(2, round(THUMBNAIL_WIDTH * height / width / 2) * 2)))
+            self.thumbnails += [np.asarray(thumbnail)] * due
+
+        if "proxy" in self.paths:
+            if self.proxy_writer is None:
+                self.start_proxy(frame.shape[1], frame.shape[0], fps)
+            try:
+                self.proxy_writer.stdin.write(frame.tobytes())
+            except BrokenPipeError:
+                self.proxy_writer.wait()
+                self.proxy_errors.seek(0)
+                raise OSError(f"Could not encode the proxy: "
+                              f"{self.proxy_errors.read().decode(errors='replace').strip()}")
+
+    def start_proxy(self, width, height, fps):
+        # The frames are encoded into a video-only proxy as they come; the audio is added from the output at the end
+        # A short unique name next to the proxy, which stays within the file name limit and never collides
+        self.proxy_video_path = os.path.join(os.path.dirname(self.paths["proxy"]),
+                                             f".video_editor_{uuid.uuid4().hex}_proxy.mp4")
+        command = [ffmpeg_binary(), "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                   "-s", f"{width}x{height}", "-r", f"{fps}", "-i", "pipe:0", "-vf",
+                   proxy_scale(self.settings["proxy_height"]), "-c:v", "libx264", "-preset", "veryfast",
+                   "-b:v", self.settings["proxy_bitrate"], "-pix_fmt", "yuv420p", self.proxy_video_path]
+        self.proxy_errors = tempfile.TemporaryFile()
+        self.proxy_writer = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                             stderr=self.proxy_errors)
+
+    def add_samples(self, samples, sample_rate):
+        # A block of output audio (samples x channels) of the moviepy path or the streaming audio engine, in order
+        if self.waveform is not None and samples.ndim == 2:
+            self.waveform.add(samples, sample_rate)
+
+    def add_segments(self, segments, work_dir):
+        # The contact sheet tiles and proxy frames of a segmented run, made by the segments' workers from the frames
+        # they encode (see SegmentPreviews), in order. Each tile is taken from the first segment that has it, and
+        # the proxy pieces are joined without re-encoding.
+        self.from_segments = True
+        for segment in segments:
+            self.thumbnails += segment.thumbnails[len(self.thumbnails):]
+        pieces = [segment.proxy_video_path for segment in segments if segment.proxy_video_path]
+        if pieces:
+            list_path = os.path.join(work_dir, "proxy_pieces.txt")
+            with open(list_path, 'w') as file:
+                for piece in pieces:
+                    escaped_path = os.path.abspath(piece).replace("'", "'\\''")
+                    file.write(f"file '{escaped_path}'\n")
+            self.proxy_video_path = os.path.join(os.path.dirname(self.paths["proxy"]),
+                                                 f".video_editor_{uuid.uuid4().hex}_proxy.mp4")
+            run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", self.proxy_video_path])
+
+    def end_proxy(self):
+        # Wait for the proxy's encoder to write the frames it was given
+        try:
+            self.proxy_writer.stdin.close()
+        except BrokenPipeError:
+            pass  # The writer failed; its own error message is reported below
+        self.proxy_writer.wait()
+        if self.proxy_writer.returncode != 0:
+            self.proxy_errors.seek(0)
+            raise subprocess.CalledProcessError(self.proxy_writer.returncode, self.proxy_writer.args,
+                                                stderr=self.proxy_errors.read())
+
+    def finish(self, output_path):
+        # Write what the encode left to do: the proxy's audio, the contact sheet and the waveform. Returns the
+        # paths of the previews.
+        if self.proxy_writer is not None:
+            self.end_proxy()
+        if self.proxy_video_path:
+            # The output's audio is copied as it is, not decoded again
+            run_ffmpeg(["-i", self.proxy_video_path, "-i", output_path, "-map", "0:v:0", "-map", "1:a?",
+                        "-c", "copy", "-movflags", "+faststart", self.paths["proxy"]])
+            self.close_proxy()
+
+        if self.thumbnails:
+            from PIL import Image
+            import numpy as np
+            Image.fromarray(np.hstack(self.thumbnails)).save(self.paths["contact_sheet"], quality=85)
+
+        if self.waveform is not None:
+            self.waveform.save(self.paths["waveform"])
+
+        return [path for path in self.paths.values() if os.path.exists(path)]
+
+    def close_proxy(self):
+        if self.proxy_writer is not None:
+            if self.proxy_writer.poll() is None:
+                self.proxy_writer.kill()
+                self.proxy_writer.wait()
+            try:
+                self.proxy_writer.stdin.close()
+            except BrokenPipeError:
+                pass
+            self.proxy_writer = None
+        if self.proxy_errors is not None:
+            self.proxy_errors.close()
+            self.proxy_errors = None
+        if self.proxy_video_path and os.path.exists(self.proxy_video_path):
+            os.remove(self.proxy_video_path)
+
+    def discard(self):
+        # The output failed, so remove whatever previews were already written
+        self.close_proxy()
+        for path in self.paths.values():
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logging.warning(f"Could not remove {path}: {str(e)}")
+
+
+class SegmentPreviews(Previews):
+    # The part of the contact sheet and proxy that one segment of a segmented run makes from the frames its worker
+    # encodes. Nothing is written next to the segment: the tiles and the video-only proxy piece go back to the
+    # parent, whose Previews joins them (add_segments).
+
+    def __init__(self, segment_path, settings, duration, start_time):
+        kinds = [kind for kind in settings["kinds"] if kind in ("contact_sheet", "proxy")]
+        super().__init__(segment_path, dict(settings, kinds=kinds), duration, True, None, start_time)
+
+    def finish(self, output_path):
+        if self.proxy_writer is not None:
+            self.end_proxy()
+            # The worker sends this object back, which needs the encoder and its error file gone
+            self.proxy_writer = None
+            self.proxy_errors.close()
+            self.proxy_errors = None
+        return []
@@ -0,0 +1,94 @@
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from video_editor.cuts import clip_ranges
+from video_editor.jsonl import file_key, load_latest
+
+DEFAULT_PROBE_CACHE_PATH = 'probe_cache.jsonl'
+DEFAULT_PROBE_THREADS = 8
+
+# Probe caches already read by this process, by path
+_loaded_caches = {}
+
+
+def load_probe_cache(cache_path):
+    if cache_path not in _loaded_caches:
+        _loaded_caches[cache_path] = load_latest(cache_path, file_key)
+    return _loaded_caches[cache_path]
+
+
+def probe_video(input_path):
+    # Read the container metadata only; ffmpeg stops after the header, so no frame is decoded
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+    stat = os.stat(input_path)
+    entry = {"path": os.path.realpath(input_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if stat.st_size == 0:
+        entry["error"] = "empty file"
+        return entry
+
+    try:
+        infos = ffmpeg_parse_infos(input_path)
+    except (OSError, IOError) as e:
+        entry["error"] = str(e).splitlines()[0]
+        return entry
+
+    entry.update({
+        "duration": infos.get("duration"),
+        "fps": infos.get("video_fps"),
+        "frames": infos.get("video_nframes"),
+        "size_px": infos.get("video_size"),
+        "has_video": bool(infos.get("video_found")),
+        "has_audio": bool(infos.get("audio_found")),
+    })
+    return entry
+
+
+def probe_videos(input_paths, cache_path=DEFAULT_PROBE_CACHE_PATH, threads=DEFAULT_PROBE_THREADS):
+    # Probe every input concurrently, each one an ffmpeg process, and return the results in input order. Results are
+    # cached by path, size and modification time like loudness measurements; files that do not exist are not cached.
+    cache = load_probe_cache(cache_path)
+
+    def probe_cached(input_path):
+        try:
+            stat = os.stat(input_path)
+        except OSError:
+            return {"path": input_path, "error": "file not found"}, False
+
+        key = (os.path.realpath(input_path), stat.st_size, stat.st_mtime_ns)
+        if key in cache:
+            return cache[key], False
+        try:
+            return probe_video(input_path), True
+        except OSError:
+            # Removed between the two calls, e.g. quarantined by another run watching the same folder
+            return {"path": input_path, "error": "file not found"}, False
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(probe_cached, input_paths))
+
+    # Only this thread appends to the cache file
+    new_entries = [entry for entry, is_new in results if is_new]
+    if new_entries:
+        with open(cache_path, 'a') as file:
+            for entry in new_entries:
+                file.write(json.dumps(entry) + '\n')
+                cache[file_key(entry)] = entry
+        logging.info(f"Probed {len(new_entries)} videos, {len(results) - len(new_entries)} found in {cache_path}")
+
+    return [entry for entry, _ in results]
+
+
+def rejection_reason(entry, pipeline):
+    # Why a probed video cannot be processed with the requested operations, or None if it can
+    if entry.get("error"):
+        return entry["error"]
+    if not entry["has_video"]:
+        return "no video stream"
+    if not entry["duration"]:
+        return "unknown duration"
+    if pipeline.changes_audio and not pipeline.rotation and not pipeline.keep_ranges and not entry["has_audio"]:
+        return "no audio stream to change"
+    if pipeline.keep_ranges and not clip_ranges(pipeline.keep_ranges, entry["duration"]):
+        return "no part of the video is inside the ranges to keep"
+    return None
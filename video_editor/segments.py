@@ -0,0 +1,38 @@
+import os
+import glob
+from video_editor.stream_copy import run_ffmpeg
+
+# Shorter segments cost more in start-up and join overhead than they gain in parallelism
+MIN_SEGMENT_SECONDS = 10.0
+
+
+def segment_count(duration, segments):
+    # How many segments a video of this duration is worth splitting into, at most the number asked for
+    return max(1, min(segments, int(duration // MIN_SEGMENT_SECONDS)))
+
+
+def split_at_keyframes(input_path, work_dir, segment_seconds):
+    # Copy the video stream into segments of roughly segment_seconds each. The segment muxer only cuts at
+    # keyframes, so nothing is decoded or re-encoded and every segment starts with a keyframe.
+    pattern = os.path.join(work_dir, "segment_%05d.mp4")
+    run_ffmpeg(["-i", input_path, "-map", "0:v:0", "-c", "copy", "-f", "segment", "-segment_time",
+                f"{segment_seconds:.3f}", "-reset_timestamps", "1", pattern])
+    return sorted(glob.glob(os.path.join(work_dir, "segment_*.mp4")))
+
+
+def join_segments(segment_paths, audio_source, output_path, work_dir, previews=None):
+    # Join the processed segments with the concat demuxer and take the audio, untouched, from the original video.
+    # previews (see previews.py) are written by the same ffmpeg run.
+    list_path = os.path.join(work_dir, "segments.txt")
+    with open(list_path, 'w') as file:
+        for segment_path in segment_paths:
+            escaped_path = os.path.abspath(segment_path).replace("'", "'\\''")
+            file.write(f"file '{escaped_path}'\n")
+
+    arguments = ["-f", "concat", "-safe", "0", "-i", list_path, "-i", audio_source, "-map", "0:v:0", "-map", "1:a?",
+                 "-c", "copy", output_path]
+    if previews:
+        previews.run_ffmpeg(arguments + previews.ffmpeg_outputs("0:v:0", ["1:a:0"] * previews.audio_outputs()))
+    else:
+        run_ffmpeg(arguments)
+    return output_path
@@ -0,0 +1,174 @@
+import re
+import logging
+import tempfile
+import subprocess
+from functools import partial
+
+# Seconds of audio held in memory at once by the streaming audio engine, whatever the length of the recording
+DEFAULT_AUDIO_CHUNK_SECONDS = 10.0
+
+# Channel counts of the layouts ffmpeg prints in its stream description
+CHANNEL_LAYOUTS = {"mono": 1, "stereo": 2, "2.1": 3, "3.0": 3, "quad": 4, "4.0": 4, "5.0": 5, "5.1": 6, "6.1": 7,
+                   "7.1": 8}
+
+
+def db_to_multiplier(increase_db):
+    return 10 ** (increase_db / 20.0)  # Convert dB to linear scale
+
+
+def ffmpeg_binary():
+    # moviepy looks for (and may download) ffmpeg when its config is imported, so only do that once ffmpeg is needed
+    from moviepy.config import get_setting
+    return get_setting("FFMPEG_BINARY")
+
+
+def run_ffmpeg(arguments):
+    # Run the ffmpeg binary bundled with moviepy, raising CalledProcessError with ffmpeg's own message on failure
+    command = [ffmpeg_binary(), "-y", "-loglevel", "error"] + arguments
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def read_ffmpeg_info(input_path):
+    # "ffmpeg -i" without an output describes the input's streams on stderr
+    result = subprocess.run([ffmpeg_binary(), "-hide_banner", "-i", input_path],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return result.stderr.decode(errors='replace')
+
+
+def read_display_rotation(input_path):
+    # ffmpeg prints the display matrix of the first video stream as "displaymatrix: rotation of -90.00 degrees"
+    match = re.search(r"displaymatrix: rotation of (-?\d+(?:\.\d+)?) degrees", read_ffmpeg_info(input_path))
+    return float(match.group(1)) if match else 0.0
+
+
+def read_video_format(input_path):
+    # ffmpeg describes the first video stream as e.g. "Video: h264 (High) (avc1 / 0x31637661), yuv420p(progressive),
+    # 1920x1080 [SAR 1:1 DAR 16:9], ..."
+    match = re.search(r"Video: (\w+)[^,]*, (\w+)[^,]*(?:\([^)]*\))?, (\d+x\d+)", read_ffmpeg_info(input_path))
+    return match.groups() if match else None
+
+
+def display_rotation(input_path, rotation_angle=None):
+    # The display rotation a copy of the first video stream should carry: the one the file already has, e.g.
+    # portrait phone footage, plus rotation_angle
+    rotation = (read_display_rotation(input_path) + (rotation_angle or 0)) % 360
+    return rotation - 360 if rotation > 180 else rotation
+
+
+def read_audio_format(input_path):
+    # ffmpeg describes the first audio stream as e.g. "Audio: aac (LC) ..., 44100 Hz, stereo, fltp"
+    match = re.search(r"Audio: .*?, (\d+) Hz, ([^,]+),", read_ffmpeg_info(input_path))
+    if not match:
+        return None
+
+    layout = match.group(2).strip()
+    channels = re.match(r"(\d+) channels", layout)
+    if channels:
+        return int(match.group(1)), int(channels.group(1))
+    # Unknown layouts are folded down to stereo
+    return int(match.group(1)), CHANNEL_LAYOUTS.get(layout.split("(")[0], 2)
+
+
+def read_audio_blocks(input_path, sample_rate, channels, chunk_samples):
+    # Decode the first audio stream as float32 PCM and yield it in blocks of at most chunk_samples per channel, so
+    # peak memory is set by the block size rather than by the duration of the recording
+    import numpy as np
+    command = [ffmpeg_binary(), "-loglevel", "error", "-i", input_path, "-map", "0:a:0", "-vn",
+               "-ac", str(channels), "-ar", str(sample_rate), "-f", "f32le", "-"]
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors)
+        try:
+            while True:
+                data = process.stdout.read(chunk_samples * channels * 4)
+                if not data:
+                    break
+                yield np.frombuffer(data, dtype=np.float32).reshape(-1, channels)
+            process.wait()
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+        if process.returncode != 0:
+            errors.seek(0)
+            message = errors.read().decode(errors='replace').strip()
+            raise OSError(f"Could not decode the audio of {input_path}: {message}")
+
+
+def write_scaled_audio(arguments, input_path, audio_format, volume_multiplier, chunk_seconds, on_block=None):
+    # Feed ffmpeg the input's audio through stdin, scaled one block at a time. The command in arguments reads the
+    # raw float32 audio as its second input. on_block, when given, also gets every scaled block.
+    import numpy as np
+    sample_rate, channels = audio_format
+    command = [ffmpeg_binary(), "-y", "-loglevel", "error"] + arguments
+    chunk_samples = max(1, int(chunk_seconds * sample_rate))
+
+    with tempfile.TemporaryFile() as errors:
+        writer = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=errors)
+        blocks = read_audio_blocks(input_path, sample_rate, channels, chunk_samples)
+        try:
+            for block in blocks:
+                scaled = np.clip(block * volume_multiplier, -1.0, 1.0)
+                if on_block:
+                    on_block(scaled)
+                writer.stdin.write(scaled.tobytes())
+        except BrokenPipeError:
+            pass  # The writer failed; its own error message is reported below
+        finally:
+            blocks.close()
+            try:
+                writer.stdin.close()
+            except BrokenPipeError:
+                pass
+            writer.wait()
+
+        if writer.returncode != 0:
+            errors.seek(0)
+            raise subprocess.CalledProcessError(writer.returncode, command, stderr=errors.read())
+
+
+def stream_copy(input_path, output_path, volume_multiplier=None, rotation_angle=None, audio_codec="aac",
+                chunk_seconds=DEFAULT_AUDIO_CHUNK_SECONDS, audio_bitrate=None, previews=None):
+    # Copy the video stream untouched. A rotation only changes the container's display-rotation metadata and a
+    # volume change only re-encodes the audio track, so the cost no longer depends on the resolution of the video.
+    # previews (see previews.py) are written by the same ffmpeg run.
+    try:
+        arguments = []
+        if rotation_angle:
+            arguments += ["-display_rotation:v:0", str(display_rotation(input_path, rotation_angle))]
+
+        arguments += ["-i", input_path]
+        audio_format = read_audio_format(input_path) if volume_multiplier is not None else None
+
+        if audio_format:
+            # The scaled audio arrives as raw PCM on stdin and replaces the original audio track
+            sample_rate, channels = audio_format
+            arguments += ["-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+                          "-map", "0:v?", "-map", "1:a", "-c:v", "copy", "-c:a", audio_codec]
+            if audio_bitrate:
+                arguments += ["-b:a", audio_bitrate]
+            arguments += [output_path]
+            on_block = None
+            if previews:
+                # The waveform is summarized from the scaled blocks on their way to ffmpeg
+                arguments += previews.ffmpeg_outputs("0:v:0", ["1:a"] * previews.audio_outputs(waveform=False),
+                                                     waveform=False)
+                on_block = partial(previews.add_samples, sample_rate=sample_rate)
+            write_scaled_audio(arguments, input_path, audio_format, volume_multiplier, chunk_seconds, on_block)
+        else:
+            arguments += ["-map", "0:v?", "-map", "0:a?", "-c:v", "copy", "-c:a", "copy", output_path]
+            if previews:
+                arguments += previews.ffmpeg_outputs("0:v:0", ["0:a:0"] * previews.audio_outputs())
+                previews.run_ffmpeg(arguments)
+            else:
+                run_ffmpeg(arguments)
+        return output_path
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Error stream copying {input_path}: {e.stderr.decode(errors='replace').strip()}")
+        print(f"Error stream copying {input_path}: {e.stderr.decode(errors='replace').strip()}")
+        return None
+    except OSError as e:
+        logging.error(f"Error stream copying {input_path}: {str(e)}")
+        print(f"Error stream copying {input_path}: {str(e)}")
+        return None
@@ -0,0 +1,49 @@
+import os
+import time
+from video_editor.discovery import walk_videos
+
+DEFAULT_POLL_SECONDS = 1.0
+DEFAULT_SETTLE_SECONDS = 5.0
+
+
+class FolderWatcher:
+    # Finds videos dropped into a folder (or any folder below it) and hands each one out once its size and
+    # modification time have stopped changing for settle_seconds, i.e. once whatever is copying it has finished.
+    # A handed out video is handed out again only if it changes.
+
+    def __init__(self, directory, valid_extensions, settle_seconds=DEFAULT_SETTLE_SECONDS, skip_dirs=()):
+        self.directory = directory
+        self.valid_extensions = valid_extensions
+        self.settle_seconds = settle_seconds
+        self.skip_dirs = skip_dirs
+        self.changing = {}  # Path -> (size and mtime, when they were last seen changing)
+        self.handled = {}  # Path -> size and mtime when it was handed out
+
+    def poll(self, limit):
+        # Return up to limit settled videos; the rest stay on disk until there is room for them
+        now = time.monotonic()
+        settled = []
+        seen = set()
+        for input_path in walk_videos(self.directory, self.valid_extensions, self.skip_dirs):
+            seen.add(input_path)
+            try:
+                stat = os.stat(input_path)
+            except OSError:
+                continue  # Moved or deleted since the folder was read
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self.handled.get(input_path) == signature:
+                continue
+
+            previous = self.changing.get(input_path)
+            if previous is None or previous[0] != signature:
+                self.changing[input_path] = (signature, now)
+            elif now - previous[1] >= self.settle_seconds and len(settled) < limit:
+                settled.append(input_path)
+                self.handled[input_path] = signature
+                del self.changing[input_path]
+
+        # Forget videos that were removed, so a new file with the same name is picked up
+        for tracked in (self.changing, self.handled):
+            for input_path in [input_path for input_path in tracked if input_path not in seen]:
+                del tracked[input_path]
+        return settled